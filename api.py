@@ -1,20 +1,82 @@
 # api.py
 
-from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import Body, FastAPI, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from email.utils import formatdate, parsedate_to_datetime
+from functools import lru_cache
 from pathlib import Path
+from typing import List, Tuple, Union
+import numpy as np
 import pandas as pd
+import asyncio
+import base64
+import binascii
+import csv
+import gzip
+import hashlib
+import io
 import json
+import logging
+import os
+import time
+
+# orjson 为可选依赖：安装后用它编码 JSON，否则退回标准库
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# brotli 为可选依赖：未安装时只提供 gzip 压缩
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from centrality import (
+    DEFAULT_CONFIDENCE,
+    METRIC_COLUMNS,
+    CentralityState,
+    CentralityTable,
+    approximate_betweenness,
+    join_rows,
+)
+from community import louvain, summarize
+from graph_index import PATH_COSTS, PPR_ALPHA, EdgeWeightIndex, GeneGraph, read_edge_frame
+from kb_search import MIN_SIMILARITY, EntityIndex, PrefixIndex, TrigramIndex
+from kb_table import KBTable
+from resource_cache import CACHE, LOAD_EXECUTOR
 
 BASE = Path(__file__).parent / "data"
 
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    启动时在后台并行预加载 data/ 下的全部资源（见第 8 节），完成前 /readyz 返回 503。
+    设置环境变量 CDK46KB_PRELOAD=0 可跳过预加载（本地开发时启动更快）。
+    """
+    task = None
+    if os.environ.get("CDK46KB_PRELOAD", "1") != "0":
+        task = asyncio.create_task(_preload_all())
+    else:
+        _STARTUP["ready"] = True
+    yield
+    if task is not None and not task.done():
+        task.cancel()
+
+
 # —— 1. FastAPI 应用 & CORS 设置 ——
 app = FastAPI(
     title="CDK4/6 Knowledge-Base REST API",
     description="提供对 data/ 目录下各种统计表格、网络 JSON、子网 JSON 等资源的 HTTP 访问接口。",
-    version="0.1"
+    version="0.1",
+    lifespan=lifespan,
 )
 
 # 允许任意域名跨域访问（如果要限制特定域名，可把 ["*"] 改为 ["https://yourdomain.com"] 等）
@@ -30,92 +92,1242 @@ app.add_middleware(
 BASE_DIR = Path(__file__).resolve().parent
 DATA_DIR = BASE_DIR / "data"
 
+# 各模块共用的数据文件
+KB_FP           = DATA_DIR / "stats" / "cdk4_6_kb.csv"
+NETWORK_CYJS_FP = DATA_DIR / "network" / "network_full.cyjs"
+EDGES_FP        = DATA_DIR / "network" / "gene_cooccurrence_edges.csv"
+COMMUNITIES_FP  = DATA_DIR / "network" / "communities.json"
+
+
+# —— 资源加载函数（结果由 resource_cache.CACHE 按文件缓存） ——
+def _read_table(fp: Path) -> pd.DataFrame:
+    """
+    读取 CSV / XLSX 表格，全部当作字符串处理，空值用空字符串代替。
+    """
+    if fp.suffix.lower() == ".xlsx":
+        return pd.read_excel(fp, dtype=str).fillna("")
+    return pd.read_csv(fp, dtype=str).fillna("")
+
+
+def _read_records(fp: Path) -> list:
+    """
+    表格转成 [{列名: 值}, ...]，复用已缓存的 DataFrame。
+    """
+    return CACHE.get(fp, _read_table).to_dict(orient="records")
+
+
+def _read_columnar(fp: Path) -> KBTable:
+    """
+    表格的列式副本（kb_table.KBTable），用于排序、过滤、分页和流式输出。
+    """
+    return KBTable(CACHE.get(fp, _read_table))
+
+
+def _read_bytes(fp: Path) -> bytes:
+    """
+    原样读取文件内容（例如直接下发的 .cyjs 文件）。
+    """
+    return fp.read_bytes()
+
+
+def _read_json(fp: Path):
+    """
+    读取并解析 JSON / .cyjs 文件。
+    """
+    return json.loads(fp.read_text(encoding="utf8"))
+
+
+# —— JSON 序列化：每个资源只编码一次，之后直接返回缓存的 UTF-8 bytes ——
+def _dumps(obj) -> bytes:
+    """
+    编码为 UTF-8 JSON bytes；与 JSONResponse 的输出保持一致（不转义中文、无多余空格）。
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def _json_body(fp: Path) -> bytes:
+    """
+    JSON 文件重新编码后的 bytes（例如样式文件）。
+    """
+    return _dumps(CACHE.get(fp, _read_json))
+
+
+@lru_cache(maxsize=None)
+def _records_body(field: str):
+    """
+    生成 loader：表格 → {field: [记录, ...]} 的 JSON bytes。
+    同一个 field 总是返回同一个函数对象，保证缓存键稳定。
+    """
+    def loader(fp: Path) -> bytes:
+        return _dumps({field: CACHE.get(fp, _read_records)})
+    loader.__qualname__ = f"_records_body({field!r})"
+    return loader
+
+
+def _elements_body(fp: Path) -> bytes:
+    """
+    .cyjs 文件中 "elements" 部分的 JSON bytes：{"elements": ...}，缺失时为空数组。
+    """
+    elements = CACHE.get(fp, _read_json).get("elements")
+    return _dumps({"elements": elements if elements is not None else []})
+
+
+# —— 预压缩：gzip / brotli 版本在首次请求时生成一次并缓存，之后按 Accept-Encoding 直接下发 ——
+# 小于该字节数的响应不压缩（压缩收益抵不过额外开销）
+MIN_COMPRESS_SIZE = 1024
+
+_COMPRESSORS = {"gzip": lambda b: gzip.compress(b, compresslevel=9, mtime=0)}
+if brotli is not None:
+    _COMPRESSORS["br"] = lambda b: brotli.compress(b, quality=9)
+
+# 同等 q 值时的优先顺序
+_ENCODING_PREFERENCE = ("br", "gzip")
+
+
+def _negotiate_encoding(accept_encoding: str):
+    """
+    解析 Accept-Encoding（含 q 值与 "*"），返回可用的最佳编码；都不可接受时返回 None。
+    """
+    prefs = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        prefs[token] = q
+
+    best, best_q = None, 0.0
+    for enc in _ENCODING_PREFERENCE:
+        if enc not in _COMPRESSORS:
+            continue
+        q = prefs.get(enc, prefs.get("*", 0.0))
+        if q > best_q:
+            best, best_q = enc, q
+    return best
+
+
+@lru_cache(maxsize=None)
+def _compressed(loader, encoding: str):
+    """
+    生成 loader：对 loader(fp) 的结果做 encoding 压缩。
+    同一组参数总是返回同一个函数对象，保证缓存键稳定。
+    """
+    compress = _COMPRESSORS[encoding]
+
+    def compressed_loader(fp: Path) -> bytes:
+        return compress(CACHE.get(fp, loader))
+    compressed_loader.__qualname__ = f"_compressed({loader.__qualname__}, {encoding!r})"
+    return compressed_loader
+
+
+# —— 条件请求：强 ETag（内容哈希）+ Last-Modified（文件 mtime），命中时返回 304 ——
+# 各类资源的 Cache-Control 策略
+CACHE_CONTROL_TABLE   = "public, max-age=60, must-revalidate"     # 统计表、节点/边表
+CACHE_CONTROL_NETWORK = "public, max-age=300, must-revalidate"    # .cyjs 网络与 elements
+CACHE_CONTROL_STYLE   = "public, max-age=86400"                   # 样式文件，极少变动
+CACHE_CONTROL_QUERY   = "public, no-cache"                        # 带查询参数的动态结果，每次都需验证
+
+
+def _content_hash(body: bytes) -> str:
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def _hashed(loader):
+    """
+    生成 loader：loader(fp) 结果的内容哈希，随资源一起缓存，避免每次请求重新计算。
+    """
+    def hash_loader(fp: Path) -> str:
+        return _content_hash(CACHE.get(fp, loader))
+    hash_loader.__qualname__ = f"_hashed({loader.__qualname__})"
+    return hash_loader
+
+
+def _etag_matches(if_none_match: str, digest: str) -> bool:
+    """
+    If-None-Match 采用弱比较：忽略 W/ 前缀与编码后缀（"<hash>-gzip"），只比较内容哈希。
+    """
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag.strip('"').split("-", 1)[0] == digest:
+            return True
+    return False
+
+
+def _not_modified_since(if_modified_since: str, mtime: float) -> bool:
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since is None:
+        return False
+    return int(mtime) <= since.timestamp()
+
+
+def _conditional_response(
+    request: Request,
+    body: bytes,
+    digest: str,
+    cache_control: str,
+    mtime: float = None,
+    encoding: str = None,
+    media_type: str = "application/json",
+) -> Response:
+    """
+    统一处理 ETag / Last-Modified / Cache-Control 响应头，以及 If-None-Match / If-Modified-Since 条件请求。
+    If-None-Match 存在时优先生效，此时忽略 If-Modified-Since。
+    """
+    headers = {
+        "ETag": f'"{digest}-{encoding}"' if encoding else f'"{digest}"',
+        "Cache-Control": cache_control,
+        "Vary": "Accept-Encoding",
+    }
+    if mtime is not None:
+        headers["Last-Modified"] = formatdate(mtime, usegmt=True)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        not_modified = _etag_matches(if_none_match, digest)
+    elif mtime is not None and "if-modified-since" in request.headers:
+        not_modified = _not_modified_since(request.headers["if-modified-since"], mtime)
+    else:
+        not_modified = False
+    if not_modified:
+        return Response(status_code=304, headers=headers)
+
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+def _query_response(request: Request, body: bytes, fp: Path) -> Response:
+    """
+    带查询参数的动态结果：ETag 取自本次响应体，Last-Modified 取自源文件。
+    """
+    return _conditional_response(request, body, _content_hash(body), CACHE_CONTROL_QUERY,
+                                 mtime=fp.stat().st_mtime)
+
+
+async def _cached_response(
+    request: Request,
+    fp: Path,
+    loader,
+    cache_control: str,
+    media_type: str = "application/json",
+) -> Response:
+    """
+    返回 loader(fp) 对应的缓存 bytes；客户端接受压缩且内容足够大时，返回预压缩版本。
+    带 ETag / Last-Modified，客户端缓存仍然有效时返回 304。
+    资源已缓存时全程不切换线程；冷加载交给 resource_cache 的专用线程池。
+    """
+    body = await CACHE.aget(fp, loader)
+    encoding = None
+    if len(body) >= MIN_COMPRESS_SIZE:
+        encoding = _negotiate_encoding(request.headers.get("accept-encoding", ""))
+        if encoding is not None:
+            body = await CACHE.aget(fp, _compressed(loader, encoding))
+    return _conditional_response(
+        request,
+        body,
+        await CACHE.aget(fp, _hashed(loader)),
+        cache_control,
+        mtime=fp.stat().st_mtime,
+        encoding=encoding,
+        media_type=media_type,
+    )
+
+
+# —— 流式输出：format=ndjson / csv 时按块生成响应体，不再拼出整张表的 JSON ——
+# 每次生成的行数
+STREAM_CHUNK_ROWS = 1000
+
+_STREAM_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv":    "text/csv; charset=utf-8",
+}
+
+# 表格类端点的 format 参数
+FORMAT_QUERY = Query("json", pattern="^(json|ndjson|csv)$", description="json（默认）/ ndjson / csv 流式输出")
+
+
+def _iter_rows(table: KBTable, rows: np.ndarray, fields: list, fmt: str):
+    """
+    逐块产出 rows 对应的 NDJSON 行或 CSV 行（CSV 先输出表头），内存占用只与块大小有关。
+    """
+    if fmt == "csv":
+        buf = io.StringIO()
+        csv.writer(buf).writerow(fields)
+        yield buf.getvalue().encode("utf-8")
+    for start in range(0, len(rows), STREAM_CHUNK_ROWS):
+        chunk = rows[start:start + STREAM_CHUNK_ROWS]
+        if fmt == "ndjson":
+            yield b"".join(_dumps(rec) + b"\n" for rec in table.records(chunk, fields))
+        else:
+            buf = io.StringIO()
+            csv.writer(buf).writerows(zip(*(table.column(f)[chunk] for f in fields)))
+            yield buf.getvalue().encode("utf-8")
+
+
+def _streaming_response(table: KBTable, fmt: str, rows: np.ndarray = None, fields: list = None,
+                        headers: dict = None) -> StreamingResponse:
+    rows = table.all_rows() if rows is None else rows
+    fields = table.columns if fields is None else fields
+    headers = {"Cache-Control": CACHE_CONTROL_QUERY, **(headers or {})}
+    return StreamingResponse(_iter_rows(table, rows, fields, fmt),
+                             media_type=_STREAM_MEDIA_TYPES[fmt], headers=headers)
+
 
 # —— 2. 根路由，交互式帮助信息 ——
 @app.get("/")
-def root():
+async def root():
     return {
         "message": "CDK4/6 Knowledge-Base REST API 已启用。可用端点示例：",
         "endpoints": {
             "/api/stats": "知识库统计表格 (JSON)",
+            "/api/stats?limit=N&cursor=&sort=-PMID&fields=PMID,Gene Symbol": "分页 / 排序 / 字段投影后的统计表格",
+            "/api/stats?eq=Gene Symbol:CDK4&contains=Drugs:palbo&in=Category:A|B&code=1.4": "服务端过滤后的统计表格",
+            "/api/stats?format=ndjson|csv": "流式输出统计表格（同样支持上述参数）",
+            "/api/stats?code=1.4&subtree=false": "按标签编号过滤（默认含全部子编号）",
+            "/api/labels?code=": "标签编号层级树上各编号的记录数（自身 / 子树汇总）",
+            "/api/pmid/{pmid}?fields=": "某篇文献（PMID）的全部知识库记录",
+            "/api/pmid/batch (POST {\"pmids\": [...]})": "批量按 PMID 查询记录，并列出未收录的 PMID",
+            "/api/kp/{kp}?limit=&offset=&fields=": "某个知识点（KP）的记录（?format=ndjson|csv 流式输出）",
+            "/api/search?q=&field=&exact=&limit=": "按实体（基因、细胞类型、疾病、药物、通路等）检索知识库记录",
+            "/api/search/entities?q=&field=&limit=&min_similarity=": "容错（三元组相似度）的实体候选，按相关度排序",
+            "/api/suggest?field=&prefix=&limit=": "实体 / 网络节点名的前缀补全（按行数或 pmid_count 降序）",
             "/api/network/full": "全局网络 Cytoscape.js JSON",
+            "/api/network/full?min_weight=N&top_edges=K": "按共现权重切片的全局网络（只含保留的边及其端点）",
+            "/api/network/neighbors/{gene}?min_weight=&limit=": "基因在共现网络中的邻居（按权重降序，含权重占比）",
+            "/api/network/ego/{gene}?hops=&min_weight=&max_nodes=": "以基因为中心的 k 跳子网 (Cytoscape.js elements)",
+            "/api/network/path?source=&target=&k=&cost=": "两个基因之间的最强 / 最短路径（含 k ≤ 3 条最短路径）",
+            "/api/network/pagerank?seeds=ESR1,ERBB2&top=&alpha=": "以种子基因集合为起点的个性化 PageRank 排名",
+            "/api/network/communities": "共现网络的社区划分、社区摘要与社区元图",
+            "/api/network/communities/{id}?min_weight=": "单个社区展开后的子网 (Cytoscape.js elements)",
             "/api/centrality": "中心性指标列表",
-            "/api/centrality/{metric}?top=N": "按指标名称获取前 N 行 CSV 数据",
+            "/api/centrality/{metric}?top=N&offset=M": "按指标名称获取排名第 M+1 起的 N 个基因（数值降序）",
+            "/api/centrality/{metric}?gene=CDK4": "查询某个基因在该指标下的名次",
+            "/api/centrality?metrics=degree,betweenness&top=N": "多指标按基因拼接的排名表",
+            "/api/centrality/betweenness/approx?epsilon=&confidence=&top=": "在共现网络上抽样估计的介数排名",
             "/api/organic/elements": "Organic Framework Cytoscape.js JSON",
             "/api/organic/nodes": "Organic Framework 节点表 (JSON)",
-            "/api/organic/edges": "Organic Framework 边表 (JSON)",
+            "/api/organic/edges": "Organic Framework 边表 (JSON；?format=ndjson|csv 流式输出)",
             "/api/subtype": "可用子网标签列表",
             "/api/subtype/{tag}": "子网 {tag} Cytoscape.js JSON",
             "/api/subtype/{tag}/nodes": "子网 {tag} 节点表 (JSON)",
-            "/api/subtype/{tag}/edges": "子网 {tag} 边表 (JSON)"
+            "/api/subtype/{tag}/edges": "子网 {tag} 边表 (JSON；?format=ndjson|csv 流式输出)",
+            "/api/subtype/{tag}/centrality?metrics=&top=": "子网 {tag} 的加权中心性（增强子网含接受预测连边后的变化）",
+            "/api/subtype/{tag}/centrality (POST {\"edges\": [[a, b, w], ...]})": "假设分析：在子网上加入一批边后增量更新中心性",
+            "/healthz": "存活检查",
+            "/readyz": "就绪检查（资源预加载完成前返回 503）"
         }
     }
 
 
 # —— 3. Statistics 模块 ——
+# 单页最多返回的行数
+STATS_MAX_LIMIT = 10000
+
+
+def _encode_cursor(offset: int, sort: str) -> str:
+    """
+    游标 = base64url("偏移量|排序规则")，只对同一排序规则有效。
+    """
+    raw = f"{offset}|{sort or ''}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str, sort: str) -> int:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        offset_str, cursor_sort = raw.split("|", 1)
+        offset = int(offset_str)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="cursor 无效 (invalid cursor)")
+    if offset < 0 or cursor_sort != (sort or ""):
+        raise HTTPException(status_code=400, detail="cursor 与当前 sort 参数不匹配 (cursor does not match sort)")
+    return offset
+
+
+def _parse_fields(table: KBTable, fields: str):
+    if fields is None:
+        return None
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in names if f not in table.columns]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"未知字段 (unknown fields): {', '.join(unknown)}")
+    return names or None
+
+
+def _split_filter(table: KBTable, expr: str, kind: str):
+    """
+    过滤表达式格式为 "列名:值"，只在第一个 ":" 处切分。
+    """
+    col, sep, value = expr.partition(":")
+    col = col.strip()
+    if not sep:
+        raise HTTPException(status_code=400, detail=f"{kind} 参数格式应为 '列名:值' (expected 'column:value'): {expr}")
+    if col not in table.columns:
+        raise HTTPException(status_code=400, detail=f"未知过滤列 (unknown filter column): {col}")
+    return col, value
+
+
+def _filter_rows(table: KBTable, eq, contains, in_, code, subtree: bool = True):
+    """
+    各过滤条件取交集，返回升序行号数组；没有任何条件时返回全部行。
+    """
+    matches = []
+    for expr in eq or []:
+        matches.append(table.match_eq(*_split_filter(table, expr, "eq")))
+    for expr in contains or []:
+        matches.append(table.match_contains(*_split_filter(table, expr, "contains")))
+    for expr in in_ or []:
+        col, values = _split_filter(table, expr, "in")
+        matches.append(table.match_in(col, values.split("|")))
+    if code:
+        matches.append(table.match_code(code.strip(), subtree))
+
+    if not matches:
+        return table.all_rows()
+    rows = min(matches, key=len)
+    for other in matches:
+        if other is not rows:
+            rows = np.intersect1d(rows, other, assume_unique=True)
+    return rows
+
+
+def _kb_fp() -> Path:
+    """
+    知识库主表路径；文件不存在时返回 404。
+    """
+    if not KB_FP.exists():
+        raise HTTPException(status_code=404, detail="stats CSV 文件未找到 (data/stats/cdk4_6_kb.csv)")
+    return KB_FP
+
+
+async def _kb_table(loader=_read_columnar):
+    """
+    知识库主表上的缓存资源，缺省为列式副本（KBTable）；loader 可换成实体索引等派生资源。
+    """
+    return await CACHE.aget(_kb_fp(), loader)
+
+
 @app.get("/api/stats")
-def get_stats():
+async def get_stats(
+    request: Request,
+    limit: int = Query(None, ge=1, le=STATS_MAX_LIMIT, description="每页行数；缺省时返回全部匹配行"),
+    cursor: str = Query(None, description="上一页响应中的 next_cursor"),
+    sort: str = Query(None, description="排序列，前缀 '-' 表示降序，例如 -PMID"),
+    fields: str = Query(None, description="逗号分隔的返回列，例如 PMID,Gene Symbol,Drugs"),
+    eq: List[str] = Query(None, description="等值过滤 '列名:值'，可重复"),
+    contains: List[str] = Query(None, description="不区分大小写的子串过滤 '列名:子串'，可重复"),
+    in_: List[str] = Query(None, alias="in", description="取值列表过滤 '列名:值1|值2'，可重复"),
+    code: str = Query(None, description="标签编号过滤，返回该编号及其全部子编号的行，例如 1.4"),
+    subtree: bool = Query(True, description="false 时 code 只匹配以该编号为最具体标签的行，不含子编号"),
+    format: str = FORMAT_QUERY,
+):
     """
     返回 data/stats/cdk4_6_kb.csv 中所有行，按 JSON 数组返回字段 'records'。
+    不带任何查询参数时直接返回缓存的整表；带查询参数时，在内存列式副本（kb_table.KBTable）上
+    依次完成 过滤 → 排序 → 分页 → 投影，返回：
+      { "records": [...], "total": 匹配行数, "next_cursor": 下一页游标或 null }
+    过滤条件（eq / contains / in / code）之间取交集，均走预先建立的列索引。
+    例：
+      GET /api/stats?limit=50&sort=-PMID&fields=PMID,Gene Symbol,Drugs
+      GET /api/stats?eq=Gene Symbol:CDK4&contains=Drugs:palbo&code=1.4
+    format=ndjson / csv 时以流的形式逐块输出匹配行，total 与 next_cursor 放在
+    X-Total-Count / X-Next-Cursor 响应头中。
     """
-    fp = DATA_DIR / "stats" / "cdk4_6_kb.csv"
-    if not fp.exists():
-        raise HTTPException(status_code=404, detail="stats CSV 文件未找到 (data/stats/cdk4_6_kb.csv)")
-    # 读取 CSV，全部当作字符串处理，空值用空字符串代替
-    df = pd.read_csv(fp, dtype=str).fillna("")
-    records = df.to_dict(orient="records")
-    return JSONResponse(content={"records": records})
+    params = (limit, cursor, sort, fields, eq, contains, in_, code)
+    if all(p is None for p in params) and format == "json":
+        return await _cached_response(request, _kb_fp(), _records_body("records"), CACHE_CONTROL_TABLE)
+
+    table = await _kb_table()
+    columns = _parse_fields(table, fields)
+    rows = _filter_rows(table, eq, contains, in_, code, subtree)
+    if sort:
+        sort_col = sort[1:] if sort.startswith("-") else sort
+        if sort_col not in table.columns:
+            raise HTTPException(status_code=400, detail=f"未知排序列 (unknown sort column): {sort_col}")
+        rows = table.sort(rows, sort_col, descending=sort.startswith("-"))
+
+    # 游标只记录偏移量：翻页时需带上相同的过滤条件
+    offset = _decode_cursor(cursor, sort) if cursor else 0
+    end = len(rows) if limit is None else offset + limit
+    page = rows[offset:end]
+    next_cursor = _encode_cursor(end, sort) if end < len(rows) else None
+
+    if format != "json":
+        headers = {"X-Total-Count": str(len(rows))}
+        if next_cursor:
+            headers["X-Next-Cursor"] = next_cursor
+        return _streaming_response(table, format, page, columns, headers)
+
+    body = _dumps({
+        "records": table.records(page, columns),
+        "total": len(rows),
+        "next_cursor": next_cursor,
+    })
+    return _query_response(request, body, KB_FP)
+
+
+@app.get("/api/labels")
+async def get_label_counts(
+    request: Request,
+    code: str = Query(None, description="只列出该编号及其后代，例如 1.4；缺省时列出全部编号"),
+):
+    """
+    标签编号（一级…五级标签）层级树上各编号的记录数，按层级顺序：
+      { "root", "labels": [ {"code": "1.4", "depth": 2, "rows": 0, "subtree_rows": 162}, ... ] }
+    rows 为以该编号为最具体标签的行数，subtree_rows 为该编号子树的总行数（与 /api/stats?code= 一致），
+    可直接用于在知识图谱节点上标注记录数。
+    """
+    table = await _kb_table()
+    root = code.strip() if code else None
+    labels = table.label_index().counts(root)
+    if root and not labels:
+        raise HTTPException(status_code=404, detail=f"标签编号不存在 (label code not found): {root}")
+    body = _dumps({"root": root, "labels": labels})
+    return _query_response(request, body, KB_FP)
+
+
+# 单次批量查询最多接受的 PMID 数
+PMID_BATCH_MAX = 1000
+
+
+@app.get("/api/pmid/{pmid}")
+async def get_pmid(
+    request: Request,
+    pmid: str,
+    fields: str = Query(None, description="逗号分隔的返回列"),
+):
+    """
+    某篇文献的全部知识库记录（按原表行序）：
+      { "pmid", "total", "records": [...] }
+    PMID 列的“值 → 行号数组”哈希索引在启动预加载时建好，查询不扫描整表。
+    例：
+      GET /api/pmid/11407596?fields=KP,Gene Symbol,Drugs
+    """
+    table = await _kb_table()
+    columns = _parse_fields(table, fields)
+    rows = table.match_eq("PMID", pmid.strip())
+    if not len(rows):
+        raise HTTPException(status_code=404, detail=f"知识库中没有该 PMID 的记录 (PMID not found): {pmid}")
+    body = _dumps({
+        "pmid": pmid.strip(),
+        "total": len(rows),
+        "records": table.records(rows, columns),
+    })
+    return _query_response(request, body, KB_FP)
+
+
+@app.post("/api/pmid/batch")
+async def get_pmid_batch(
+    pmids: List[Union[int, str]] = Body(..., embed=True, description=f"PMID 列表（数字或字符串），最多 {PMID_BATCH_MAX} 个"),
+    fields: str = Body(None, embed=True, description="逗号分隔的返回列"),
+):
+    """
+    批量按 PMID 查询，请求体为 {"pmids": [11407596, "37875500", ...], "fields": "KP,Gene Symbol"}，返回：
+      { "requested", "found", "missing": [未收录的 PMID], "results": {PMID: [记录, ...]} }
+    重复的 PMID 只查询一次；每个 PMID 都是一次哈希查找，不必下载整个 /api/stats。
+    """
+    if len(pmids) > PMID_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"单次最多查询 {PMID_BATCH_MAX} 个 PMID (too many PMIDs): {len(pmids)}")
+    table = await _kb_table()
+    columns = _parse_fields(table, fields)
+    results, missing = {}, []
+    for pmid in dict.fromkeys(str(p).strip() for p in pmids):
+        rows = table.match_eq("PMID", pmid)
+        if len(rows):
+            results[pmid] = table.records(rows, columns)
+        else:
+            missing.append(pmid)
+    body = _dumps({
+        "requested": len(results) + len(missing),
+        "found": len(results),
+        "missing": missing,
+        "results": results,
+    })
+    return Response(content=body, media_type="application/json", headers={"Cache-Control": CACHE_CONTROL_QUERY})
+
+
+@app.get("/api/kp/{kp}")
+async def get_kp(
+    request: Request,
+    kp: str,
+    limit: int = Query(None, ge=1, le=STATS_MAX_LIMIT, description="最多返回的记录数；缺省时返回全部"),
+    offset: int = Query(0, ge=0, description="跳过的记录数"),
+    fields: str = Query(None, description="逗号分隔的返回列"),
+    format: str = FORMAT_QUERY,
+):
+    """
+    某个知识点（KP，例如 KP1）的记录（按原表行序），以及涉及的文献数：
+      { "kp", "total", "pmids", "records": [...] }
+    KP 列的哈希索引在启动预加载时建好；format=ndjson / csv 时流式输出，total 放在 X-Total-Count 响应头中。
+    例：
+      GET /api/kp/KP1?limit=100&fields=PMID,Gene Symbol
+    """
+    table = await _kb_table()
+    columns = _parse_fields(table, fields)
+    rows = table.match_eq("KP", kp.strip())
+    if not len(rows):
+        raise HTTPException(status_code=404, detail=f"知识库中没有该 KP 的记录 (KP not found): {kp}")
+    end = len(rows) if limit is None else offset + limit
+    page = rows[offset:end]
+    if format != "json":
+        return _streaming_response(table, format, page, columns, {"X-Total-Count": str(len(rows))})
+    body = _dumps({
+        "kp": kp.strip(),
+        "total": len(rows),
+        "pmids": len(set(table.column("PMID")[rows].tolist())),
+        "records": table.records(page, columns),
+    })
+    return _query_response(request, body, KB_FP)
+
+
+def _entity_index(fp: Path) -> EntityIndex:
+    """
+    知识库实体列的倒排索引（kb_search.EntityIndex），复用已缓存的 DataFrame。
+    """
+    return EntityIndex(CACHE.get(fp, _read_table))
+
+
+@app.get("/api/search")
+async def search_kb(
+    request: Request,
+    q: str = Query(..., min_length=1, description="检索词；逗号分隔的多个实体需同时命中"),
+    field: List[str] = Query(None, description="检索的实体列，可重复；缺省时检索全部实体列"),
+    exact: bool = Query(False, description="true 时精确匹配实体，否则为不区分大小写的子串匹配"),
+    limit: int = Query(100, ge=0, le=STATS_MAX_LIMIT, description="最多返回的记录数"),
+    fields: str = Query(None, description="逗号分隔的返回列"),
+):
+    """
+    在知识库实体列的倒排索引上检索，返回：
+      { "query", "fields", "exact", "total", "counts": {列名: 命中行数}, "records": [...] }
+    单元格中的多个实体（如 "CDK4,CDK6"）分别建索引；查询只扫描各列的不同实体，不扫描整表。
+    例：
+      GET /api/search?q=palbo&field=Drugs
+      GET /api/search?q=CDK4,CDK6&field=Gene Symbol&exact=true
+    """
+    index = await _kb_table(_entity_index)
+    table = await _kb_table()
+    columns = _parse_fields(table, fields)
+    search_cols = field or index.columns
+    unknown = [c for c in search_cols if c not in index.columns]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"不是可检索的实体列 (not a searchable field): {', '.join(unknown)}")
+
+    counts = {}
+    hits = []
+    for c in search_cols:
+        rows = index.search(c, q, exact)
+        counts[c] = len(rows)
+        if len(rows):
+            hits.append(rows)
+    rows = np.unique(np.concatenate(hits)) if hits else np.empty(0, dtype=np.int64)
+    body = _dumps({
+        "query": q,
+        "fields": search_cols,
+        "exact": exact,
+        "total": len(rows),
+        "counts": counts,
+        "records": table.records(rows[:limit], columns),
+    })
+    return _query_response(request, body, KB_FP)
+
+
+def _trigram_index(fp: Path) -> TrigramIndex:
+    """
+    实体的三元组索引（kb_search.TrigramIndex），建立在已缓存的 EntityIndex 之上。
+    """
+    return TrigramIndex(CACHE.get(fp, _entity_index))
+
+
+@app.get("/api/search/entities")
+async def search_entities(
+    request: Request,
+    q: str = Query(..., min_length=1, description="检索词，允许拼写错误"),
+    field: List[str] = Query(None, description="候选实体所在的列，可重复；缺省时为全部实体列"),
+    limit: int = Query(20, ge=1, le=200, description="最多返回的候选数"),
+    min_similarity: float = Query(MIN_SIMILARITY, ge=0, le=1, description="三元组相似度下限"),
+):
+    """
+    按三元组相似度检索不同的实体取值（而不是记录），返回：
+      { "query", "candidates": [ {"field", "value", "key", "rows", "similarity", "match"}, ... ] }
+    match 为 exact / substring / fuzzy；排序依次按 match、相似度降序、命中行数降序。
+    取得候选后可用 /api/search?q=<value>&field=<field>&exact=true 拿到对应记录。
+    例：
+      GET /api/search/entities?q=Palbocicib
+      GET /api/search/entities?q=CDKN2&field=Gene Symbol&limit=5
+    """
+    index = await _kb_table(_trigram_index)
+    unknown = [c for c in field or [] if c not in index.columns]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"不是可检索的实体列 (not a searchable field): {', '.join(unknown)}")
+    body = _dumps({
+        "query": q,
+        "candidates": index.search(q, field, limit, min_similarity),
+    })
+    return _query_response(request, body, KB_FP)
+
+
+# 自动补全中代表全局网络节点名（network_full.cyjs 的 label，按 pmid_count 排序）的字段名
+SUGGEST_NETWORK_FIELD = "network"
+
+
+def _kb_prefix_index(fp: Path) -> PrefixIndex:
+    """
+    知识库各实体列的前缀补全表，频次为包含该实体的行数。
+    """
+    return PrefixIndex.from_entity_index(CACHE.get(fp, _entity_index))
+
+
+def _network_prefix_index(fp: Path) -> PrefixIndex:
+    """
+    全局网络节点名的前缀补全表，频次为节点的 pmid_count。
+    """
+    nodes = CACHE.get(fp, _read_json).get("elements", {}).get("nodes", [])
+    index = PrefixIndex()
+    index.add_field(
+        SUGGEST_NETWORK_FIELD,
+        [str(n["data"].get("label", n["data"].get("name", n["data"].get("id")))) for n in nodes],
+        [n["data"].get("pmid_count") or 0 for n in nodes],
+    )
+    return index
+
+
+@app.get("/api/suggest")
+async def suggest(
+    request: Request,
+    field: str = Query("Gene Symbol", description=f"实体列名，或 '{SUGGEST_NETWORK_FIELD}' 表示全局网络节点名"),
+    prefix: str = Query("", description="前缀（不区分大小写）；为空时返回频次最高的取值"),
+    limit: int = Query(10, ge=1, le=100, description="最多返回的补全数"),
+):
+    """
+    前缀补全，按频次降序（实体列为命中行数，网络节点为 pmid_count）：
+      { "field", "prefix", "suggestions": [ {"value": "Palbociclib", "count": 660}, ... ] }
+    各字段的取值预先按规范形式排好序，前缀区间用二分查找定位，不扫描整表。
+    例：
+      GET /api/suggest?field=Drugs&prefix=pal&limit=5
+      GET /api/suggest?field=network&prefix=cdk
+    """
+    if field == SUGGEST_NETWORK_FIELD:
+        fp = NETWORK_CYJS_FP
+        if not fp.exists():
+            raise HTTPException(status_code=404, detail="network_full.cyjs 未找到 (data/network/network_full.cyjs)")
+        index = await CACHE.aget(fp, _network_prefix_index)
+    else:
+        fp = KB_FP
+        index = await _kb_table(_kb_prefix_index)
+    if field not in index.fields:
+        raise HTTPException(status_code=400, detail=f"不支持补全的字段 (unsupported suggest field): {field}")
+    body = _dumps({
+        "field": field,
+        "prefix": prefix,
+        "suggestions": index.suggest(field, prefix, limit),
+    })
+    return _query_response(request, body, fp)
 
 
 # —— 4. Global Network 模块 ——
+
+
+def _cyjs_edge_index(fp: Path):
+    """
+    .cyjs 的边按权重降序建立索引：返回 (除 elements 外的顶层字段, 节点元素列表, 按权重降序的边元素列表,
+    EdgeWeightIndex)，索引中的端点编号即节点元素在列表中的下标。
+    """
+    doc = CACHE.get(fp, _read_json)
+    elements = doc.get("elements", {})
+    nodes, edges = elements.get("nodes", []), elements.get("edges", [])
+    pos = {n["data"]["id"]: i for i, n in enumerate(nodes)}
+    keep = [e for e in edges if e["data"].get("source") in pos and e["data"].get("target") in pos]
+    index = EdgeWeightIndex(
+        [pos[e["data"]["source"]] for e in keep],
+        [pos[e["data"]["target"]] for e in keep],
+        [float(e["data"].get("weight") or 0) for e in keep],
+    )
+    meta = {k: v for k, v in doc.items() if k != "elements"}
+    return meta, nodes, [keep[j] for j in index.order.tolist()], index
+
+
 @app.get("/api/network/full")
-def get_network_full():
+async def get_network_full(
+    request: Request,
+    min_weight: float = Query(None, ge=0, description="只保留共现权重不低于该值的边"),
+    top_edges: int = Query(None, ge=0, description="只保留权重最高的 K 条边"),
+):
     """
-    原样返回 data/network/network_full.cyjs 文件，以 application/json 形式输出。
+    不带参数时原样返回 data/network/network_full.cyjs 文件，以 application/json 形式输出；
+    客户端支持时返回预压缩的 br / gzip 版本。
+    带 min_weight / top_edges 时按权重切片：只返回保留下来的边及其端点节点（结构与 .cyjs 相同），
+    两者同时给出时取交集。边预先按权重降序排好，切片只是一次二分查找加前缀截取。
+    例：
+      GET /api/network/full?min_weight=20
+      GET /api/network/full?top_edges=500
     """
-    fp = DATA_DIR / "network" / "network_full.cyjs"
+    fp = NETWORK_CYJS_FP
     if not fp.exists():
         raise HTTPException(status_code=404, detail="network_full.cyjs 未找到 (data/network/network_full.cyjs)")
-    return FileResponse(fp, media_type="application/json")
+    if min_weight is None and top_edges is None:
+        return await _cached_response(request, fp, _read_bytes, CACHE_CONTROL_NETWORK)
+
+    meta, nodes, edges, index = await CACHE.aget(fp, _cyjs_edge_index)
+    k = index.prefix(min_weight, top_edges)
+    body = _dumps({
+        **meta,
+        "elements": {
+            "nodes": [nodes[i] for i in index.nodes(k).tolist()],
+            "edges": edges[:k],
+        },
+    })
+    return _query_response(request, body, fp)
+
+
+# 共现网络的 CSR 邻接索引（graph_index.GeneGraph），由边表构建，启动时预加载
+async def _gene_graph() -> GeneGraph:
+    if not EDGES_FP.exists():
+        raise HTTPException(status_code=404, detail="gene_cooccurrence_edges.csv 未找到 (data/network/)")
+    return await CACHE.aget(EDGES_FP, GeneGraph.from_edges_csv)
+
+
+def _node_id(graph: GeneGraph, gene: str) -> int:
+    i = graph.node_id(gene)
+    if i is None:
+        raise HTTPException(status_code=404, detail=f"基因不在共现网络中 (gene not in network): {gene}")
+    return i
+
+
+@app.get("/api/network/neighbors/{gene}")
+async def get_network_neighbors(
+    request: Request,
+    gene: str,
+    min_weight: float = Query(0, ge=0, description="只返回共现权重不低于该值的邻居"),
+    limit: int = Query(50, ge=1, description="最多返回的邻居数"),
+):
+    """
+    查询基因在全局共现网络中的邻居，按共现权重降序：
+      { "gene", "degree", "strength", "total",
+        "neighbors": [ {"gene": "CDK6", "weight": 131.0, "share": 0.12}, ... ] }
+    total 为满足 min_weight 的邻居总数；share 为该邻居权重占基因强度（全部相邻边权重之和）的比例。
+    邻居区间在索引里已按权重降序排好，top-k 只是切片。
+    例：
+      GET /api/network/neighbors/CCND1?min_weight=10&limit=20
+    """
+    graph = await _gene_graph()
+    i = _node_id(graph, gene)
+    nbr, w = graph.neighbors(i, min_weight)
+    total = len(nbr)
+    nbr, w = nbr[:limit], w[:limit]
+    share = graph.weight_share(i, w)
+    body = _dumps({
+        "gene": graph.names[i],
+        "degree": graph.degree(i),
+        "strength": float(graph.strength[i]),
+        "total": total,
+        "neighbors": [
+            {"gene": graph.names[j], "weight": float(x), "share": float(r)}
+            for j, x, r in zip(nbr.tolist(), w.tolist(), share.tolist())
+        ],
+    })
+    return _query_response(request, body, EDGES_FP)
+
+
+def _cyjs_node_index(fp: Path) -> dict:
+    """
+    .cyjs 中的节点元素按基因名索引：{name: {"data": {...}, "position": {...}}}，
+    用于给子图节点带上预设坐标与 Cytoscape 计算的中心性等属性。
+    """
+    nodes = CACHE.get(fp, _read_json).get("elements", {}).get("nodes", [])
+    return {n["data"].get("name", n["data"].get("id")): n for n in nodes}
+
+
+def _subgraph_elements(graph: GeneGraph, node_index: dict, nodes, edges, extra: dict = None) -> dict:
+    """
+    把子图（节点编号列表 + (u, v, w) 边列表）转成 Cytoscape.js elements。
+    节点沿用 network_full.cyjs 里的 id / 属性 / position；不在 .cyjs 中的节点以基因名作 id。
+    extra 为 {节点编号: {附加属性}}，会合并进节点的 data。
+    """
+    extra = extra or {}
+    node_elems, elem_id = [], {}
+    for u in nodes:
+        name = graph.names[u]
+        src = node_index.get(name)
+        data = dict(src["data"]) if src else {"id": name, "name": name, "label": name}
+        data.update(extra.get(u, {}))
+        elem = {"data": data}
+        if src and "position" in src:
+            elem["position"] = src["position"]
+        elem_id[u] = data["id"]
+        node_elems.append(elem)
+    edge_elems = [
+        {"data": {
+            "id": f"{elem_id[u]}-{elem_id[v]}",
+            "source": elem_id[u],
+            "target": elem_id[v],
+            "name": f"{graph.names[u]} (interacts with) {graph.names[v]}",
+            "weight": float(w),
+        }}
+        for u, v, w in edges
+    ]
+    return {"nodes": node_elems, "edges": edge_elems}
+
+
+@app.get("/api/network/ego/{gene}")
+async def get_network_ego(
+    request: Request,
+    gene: str,
+    hops: int = Query(1, ge=1, le=4, description="最多扩展的跳数"),
+    min_weight: float = Query(0, ge=0, description="只沿共现权重不低于该值的边扩展"),
+    max_nodes: int = Query(200, ge=1, le=5000, description="子图节点数上限（按权重优先保留）"),
+):
+    """
+    以 gene 为中心的 k 跳子网（ego network），直接返回可渲染的 Cytoscape.js elements：
+      { "gene", "hops", "min_weight", "truncated", "elements": {"nodes": [...], "edges": [...]} }
+    节点带 network_full.cyjs 中的预设 position 与中心性属性，并附加 "hop"（离中心的跳数）；
+    边为所选节点之间满足 min_weight 的全部共现边。
+    例：
+      GET /api/network/ego/CCND1?hops=2&min_weight=10
+    """
+    graph = await _gene_graph()
+    i = _node_id(graph, gene)
+    node_index = await CACHE.aget(NETWORK_CYJS_FP, _cyjs_node_index) if NETWORK_CYJS_FP.exists() else {}
+    nodes, hop_of, truncated = graph.ego(i, hops, min_weight, max_nodes)
+    edges = graph.induced_edges(nodes, min_weight)
+    body = _dumps({
+        "gene": graph.names[i],
+        "hops": hops,
+        "min_weight": min_weight,
+        "truncated": truncated,
+        "elements": _subgraph_elements(graph, node_index, nodes, edges,
+                                       {u: {"hop": h} for u, h in hop_of.items()}),
+    })
+    return _query_response(request, body, EDGES_FP)
+
+
+# k 最短路径的条数上限：Yen 算法每条路径要对每个偏离点各跑一次 Dijkstra，
+# 800 节点的网络上 k = 3 时最坏约 75 ms，k = 10 时可达 400 ms 以上
+PATH_MAX_K = 3
+
+
+@app.get("/api/network/path")
+async def get_network_path(
+    request: Request,
+    source: str = Query(..., description="起点基因"),
+    target: str = Query(..., description="终点基因"),
+    k: int = Query(1, ge=1, le=PATH_MAX_K, description="返回的路径条数（k 最短路径）"),
+    cost: str = Query("inverse", pattern="^(" + "|".join(PATH_COSTS) + ")$",
+                      description="边代价：inverse = 1/共现权重（最强路径），hops = 跳数"),
+):
+    """
+    共现网络中两个基因之间的最短 / 最强路径（Dijkstra），k > 1 时用 Yen 算法给出前 k 条无环路径：
+      { "source", "target", "cost", "paths": [ {"genes": [...], "weights": [...], "hops", "cost"}, ... ] }
+    两个基因不连通时 paths 为空数组。常用枢纽基因的单源结果在内存中 LRU 缓存。
+    例：
+      GET /api/network/path?source=ESR1&target=CDKN2A&k=3
+    """
+    graph = await _gene_graph()
+    s, t = _node_id(graph, source), _node_id(graph, target)
+    # 纯 Python 的 Dijkstra / Yen 放到线程池里执行，不阻塞事件循环
+    loop = asyncio.get_running_loop()
+    paths = await loop.run_in_executor(LOAD_EXECUTOR, graph.k_shortest_paths, s, t, k, cost)
+    body = _dumps({
+        "source": graph.names[s],
+        "target": graph.names[t],
+        "cost": cost,
+        "paths": [
+            {
+                "genes": [graph.names[u] for u in p],
+                "weights": [graph.edge_weight(u, v) for u, v in zip(p, p[1:])],
+                "hops": len(p) - 1,
+                "cost": c,
+            }
+            for c, p in paths
+        ],
+    })
+    return _query_response(request, body, EDGES_FP)
+
+
+@app.get("/api/network/pagerank")
+async def get_network_pagerank(
+    request: Request,
+    seeds: str = Query(..., description="逗号分隔的种子基因，例如 ESR1,ERBB2,CCND1"),
+    top: int = Query(30, ge=1, le=1000, description="返回前 N 名"),
+    alpha: float = Query(PPR_ALPHA, ge=0.5, le=0.99, description="阻尼系数（沿边游走的概率）"),
+    exclude_seeds: bool = Query(False, description="排名中是否去掉种子基因本身"),
+):
+    """
+    以种子基因集合为起点的个性化 PageRank（按共现权重游走），返回与种子最相关的基因：
+      { "seeds": [...], "missing": [...], "alpha", "rows": [ {"rank", "gene", "score", "seed"}, ... ] }
+    missing 为不在共现网络中的种子（被忽略）；全部种子都不在网络中时返回 404。
+    单个种子的结果按种子缓存，任意组合的种子集合都只需对未见过的种子做一次迭代。
+    例：
+      GET /api/network/pagerank?seeds=ESR1,ERBB2,CCND1&top=20&exclude_seeds=true
+    """
+    graph = await _gene_graph()
+    names = [g.strip() for g in seeds.split(",") if g.strip()]
+    ids = {g: graph.node_id(g) for g in names}
+    found = sorted({i for i in ids.values() if i is not None})
+    if not found:
+        raise HTTPException(status_code=404, detail=f"种子基因均不在共现网络中 (no seed in network): {seeds}")
+    loop = asyncio.get_running_loop()
+    scores = await loop.run_in_executor(LOAD_EXECUTOR, graph.personalized_pagerank, found, alpha)
+    candidates = scores.copy()
+    if exclude_seeds:
+        candidates[found] = -1.0
+    k = min(top, graph.n_nodes - (len(found) if exclude_seeds else 0))
+    order = np.argpartition(-candidates, k - 1)[:k] if k > 0 else np.empty(0, dtype=np.int64)
+    order = order[np.lexsort((order, -candidates[order]))]
+    seed_set = set(found)
+    body = _dumps({
+        "seeds": [graph.names[i] for i in found],
+        "missing": [g for g, i in ids.items() if i is None],
+        "alpha": alpha,
+        "rows": [
+            {"rank": r + 1, "gene": graph.names[i], "score": float(scores[i]), "seed": i in seed_set}
+            for r, i in enumerate(order.tolist())
+        ],
+    })
+    return _query_response(request, body, EDGES_FP)
+
+
+# 社区划分：优先使用 scripts/build_data.py 预先生成的 communities.json，
+# 文件不存在时直接在边表上运行 Louvain（结果随边表缓存，与构建脚本的输出一致）
+def _live_communities(fp: Path) -> dict:
+    graph = CACHE.get(fp, GeneGraph.from_edges_csv)
+    node_index = CACHE.get(NETWORK_CYJS_FP, _cyjs_node_index) if NETWORK_CYJS_FP.exists() else {}
+    pmid_count = {name: n["data"].get("pmid_count") for name, n in node_index.items()}
+    return summarize(graph, louvain(graph), pmid_count)
+
+
+def _live_communities_body(fp: Path) -> bytes:
+    return _dumps(CACHE.get(fp, _live_communities))
+
+
+async def _communities() -> dict:
+    if COMMUNITIES_FP.exists():
+        return await CACHE.aget(COMMUNITIES_FP, _read_json)
+    await _gene_graph()
+    return await CACHE.aget(EDGES_FP, _live_communities)
+
+
+@app.get("/api/network/communities")
+async def get_network_communities(request: Request):
+    """
+    全局共现网络的社区划分（加权 Louvain）：
+      {
+        "resolution", "modularity", "n_communities",
+        "communities": [ {"id", "size", "internal_weight", "strength", "top_genes": [...]}, ... ],
+        "elements": { "nodes": [...], "edges": [...] },   # 社区元图，可直接交给 Cytoscape.js 渲染
+        "assignment": { "CDK4": 0, ... }                  # 基因 → 社区编号
+      }
+    前端可先渲染社区元图，点击社区后再请求 /api/network/communities/{id} 展开。
+    """
+    if COMMUNITIES_FP.exists():
+        return await _cached_response(request, COMMUNITIES_FP, _json_body, CACHE_CONTROL_NETWORK)
+    await _gene_graph()
+    return await _cached_response(request, EDGES_FP, _live_communities_body, CACHE_CONTROL_NETWORK)
+
+
+@app.get("/api/network/communities/{community_id}")
+async def get_network_community(
+    request: Request,
+    community_id: int,
+    min_weight: float = Query(0, ge=0, description="只返回共现权重不低于该值的社区内部边"),
+):
+    """
+    单个社区展开后的子网（Cytoscape.js elements），节点附加 "community" 属性：
+      { "community": {"id", "size", ...}, "elements": {"nodes": [...], "edges": [...]} }
+    例：
+      GET /api/network/communities/0?min_weight=5
+    """
+    doc = await _communities()
+    if not 0 <= community_id < doc["n_communities"]:
+        raise HTTPException(status_code=404, detail=f"社区不存在 (community not found): {community_id}")
+    graph = await _gene_graph()
+    node_index = await CACHE.aget(NETWORK_CYJS_FP, _cyjs_node_index) if NETWORK_CYJS_FP.exists() else {}
+    members = [graph.id_of[g] for g, c in doc["assignment"].items() if c == community_id and g in graph.id_of]
+    body = _dumps({
+        "community": doc["communities"][community_id],
+        "elements": _subgraph_elements(graph, node_index, members, graph.induced_edges(members, min_weight),
+                                       {u: {"community": community_id} for u in members}),
+    })
+    return _query_response(request, body, COMMUNITIES_FP if COMMUNITIES_FP.exists() else EDGES_FP)
 
 
 # —— 5. Centrality 模块 ——
+# 每个指标解析成 centrality.CentralityTable（按数值降序的 float 数组 + 基因 → 名次索引）并缓存
+def _centrality_fp(metric_name: str) -> Path:
+    fp = DATA_DIR / "centrality" / f"{metric_name}.csv"
+    if not fp.exists():
+        raise HTTPException(status_code=404, detail=f"centrality 文件未找到: {metric_name}.csv")
+    return fp
+
+
 @app.get("/api/centrality")
-def list_centrality_metrics():
+async def list_centrality_metrics(
+    request: Request,
+    metrics: str = Query(None, description="逗号分隔的多个指标，按第一个指标的排名拼接，例如 degree,betweenness"),
+    top: int = Query(30, ge=1, description="返回前 N 名"),
+    offset: int = Query(0, ge=0, description="跳过前 offset 名"),
+    gene: str = Query(None, description="只返回该基因在各指标下的数值与名次"),
+):
     """
     列出 data/centrality 文件夹下所有 CSV 文件（不含扩展名）。
+    带 metrics 参数时改为多指标拼接查询：以第一个指标的排名为序，
+    每行给出基因在各指标下的数值与名次：
+      { "metrics": [...], "total": N, "rows": [ {"gene", "degree", "degree_rank", ...}, ... ] }
+    例：
+      GET /api/centrality?metrics=degree,betweenness&top=20
+      GET /api/centrality?metrics=degree,betweenness,closeness&gene=CDK4
     """
     folder = DATA_DIR / "centrality"
     if not folder.exists():
         raise HTTPException(status_code=404, detail="centrality 文件夹未找到 (data/centrality)")
-    # 仅查后缀为 .csv 的文件
-    metrics = [p.stem for p in folder.glob("*.csv")]
-    return {"metrics": metrics}
+    if metrics is None:
+        # 仅查后缀为 .csv 的文件
+        return {"metrics": [p.stem for p in folder.glob("*.csv")]}
+
+    names = [m.strip() for m in metrics.split(",") if m.strip()]
+    if not names:
+        raise HTTPException(status_code=400, detail="metrics 参数不能为空")
+    fps = [_centrality_fp(m) for m in names]
+    tables = [await CACHE.aget(fp, CentralityTable.from_csv) for fp in fps]
+    lead = tables[0]
+    if gene is not None:
+        genes = [gene]
+    else:
+        genes = lead.genes[offset:offset + top]
+    body = _dumps({
+        "metrics": names,
+        "total": len(lead),
+        "rows": join_rows(tables, genes),
+    })
+    return _query_response(request, body, max(fps, key=lambda p: p.stat().st_mtime))
+
+
+# 近似介数只接受固定的几档 (epsilon, confidence)：请求值向更严格的一档取整（epsilon 取不大于它的最大档，
+# confidence 取不小于它的最小档），误差保证不会弱于请求值，缓存的结果表最多 5 × 3 份；
+# 超出最严格一档的请求由 Query 的 ge / le 直接拒绝
+APPROX_EPSILONS = (0.01, 0.02, 0.05, 0.1, 0.2)
+APPROX_CONFIDENCES = (0.9, 0.95, 0.99)
+
+# 近似介数在大网络上可能要算很久，放在单独的单线程池里逐个计算，不占用冷加载线程池
+BETWEENNESS_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="betweenness")
+
+
+def _snap_accuracy(epsilon: float, confidence: float):
+    epsilon = max((e for e in APPROX_EPSILONS if e <= epsilon), default=APPROX_EPSILONS[0])
+    confidence = min((c for c in APPROX_CONFIDENCES if c >= confidence), default=APPROX_CONFIDENCES[-1])
+    return epsilon, confidence
+
+
+@lru_cache(maxsize=len(APPROX_EPSILONS) * len(APPROX_CONFIDENCES))
+def _approx_betweenness(epsilon: float, confidence: float):
+    """
+    返回 loader：在共现网络上抽样估计介数，得到 (CentralityTable, 抽样源点数)。
+    按 (epsilon, confidence) 生成不同的 loader，结果与边表一起缓存、随边表更新失效；
+    参数须先经 _snap_accuracy 取整到固定档位。
+    """
+    def loader(fp: Path):
+        graph = CACHE.get(fp, GeneGraph.from_edges_csv)
+        values, samples = approximate_betweenness(graph, epsilon, confidence)
+        return CentralityTable("betweenness", graph.names, values), samples
+    return loader
+
+
+@app.get("/api/centrality/betweenness/approx")
+async def get_betweenness_approx(
+    request: Request,
+    epsilon: float = Query(0.05, ge=APPROX_EPSILONS[0], le=0.5,
+                           description=f"归一化介数的允许误差 ε，取整到 {APPROX_EPSILONS} 中不大于它的一档"),
+    confidence: float = Query(DEFAULT_CONFIDENCE, gt=0, le=APPROX_CONFIDENCES[-1],
+                              description=f"误差不超过 ε 的概率，取整到 {APPROX_CONFIDENCES} 中不小于它的一档"),
+    top: int = Query(30, ge=1, description="返回前 N 名"),
+    offset: int = Query(0, ge=0, description="跳过前 offset 名"),
+    gene: str = Query(None, description="查询某个基因的名次与数值"),
+):
+    """
+    直接在共现边表上用随机源点抽样估计全部基因的（加权）介数并排名，估计的是
+    /api/centrality/betweenness 发布的同一指标（按 1/权重 计距离的 Brandes 介数），
+    适合边表更新后、排名表尚未重新生成时，或网络过大无法精确计算时使用：
+      { "metric": "betweenness", "epsilon", "confidence", "samples", "exact",
+        "top", "offset", "total", "rows": [ {"rank", "gene", "value"}, ... ] }
+    epsilon / confidence 为实际使用（取整后）的档位，保证不弱于请求值（confidence 超过
+    0.99 时返回 422）；samples 为实际抽样的源点数，
+    不少于节点数时 exact 为 true（即精确值）。
+    例：
+      GET /api/centrality/betweenness/approx?epsilon=0.02&top=32
+    """
+    epsilon, confidence = _snap_accuracy(epsilon, confidence)
+    graph = await _gene_graph()
+    table, samples = await CACHE.aget(EDGES_FP, _approx_betweenness(epsilon, confidence), BETWEENNESS_EXECUTOR)
+    if gene is not None:
+        i = table.rank_of(gene)
+        if i is None:
+            raise HTTPException(status_code=404, detail=f"{gene} 不在共现网络中")
+        rows = [table.row(i)]
+    else:
+        rows = table.rows(top, offset)
+    body = _dumps({
+        "metric": "betweenness",
+        "epsilon": epsilon,
+        "confidence": confidence,
+        "samples": samples,
+        "exact": samples >= graph.n_nodes,
+        "top": top,
+        "offset": offset,
+        "total": len(table),
+        "rows": rows,
+    })
+    return _query_response(request, body, EDGES_FP)
 
 
 @app.get("/api/centrality/{metric_name}")
-def get_centrality_metric(
+async def get_centrality_metric(
+    request: Request,
     metric_name: str,
-    top: int = Query(30, ge=1, description="返回 CSV 文件的前 N 行")
+    top: int = Query(30, ge=1, description="返回前 N 名"),
+    offset: int = Query(0, ge=0, description="跳过前 offset 名"),
+    gene: str = Query(None, description="查询某个基因的名次与数值"),
 ):
     """
-    返回 data/centrality/{metric_name}.csv 文件前 top 行的记录（按 JSON 数组格式）。
+    返回指标 metric_name 按数值降序的第 offset+1 … offset+top 名（数值为数字而非字符串）：
+      { "metric", "top", "offset", "total", "rows": [ {"rank": 1, "gene": "CDKN2A", "value": 1138.0}, ... ] }
+    带 gene 参数时只返回该基因的一行；基因不在排名表中时返回 404。
     例：
-      GET /api/centrality/degree(weight)?top=20
+      GET /api/centrality/degree?top=20
+      GET /api/centrality/betweenness?gene=CDK4
     """
-    csv_fp = DATA_DIR / "centrality" / f"{metric_name}.csv"
-    if not csv_fp.exists():
-        raise HTTPException(status_code=404, detail=f"centrality 文件未找到: {metric_name}.csv")
-    df = pd.read_csv(csv_fp, dtype=str).fillna("")
-    df_top = df.head(top)
-    rows = df_top.to_dict(orient="records")
-    return {"metric": metric_name, "top": top, "rows": rows}
+    csv_fp = _centrality_fp(metric_name)
+    table = await CACHE.aget(csv_fp, CentralityTable.from_csv)
+    if gene is not None:
+        i = table.rank_of(gene)
+        if i is None:
+            raise HTTPException(status_code=404, detail=f"{gene} 不在 {metric_name} 排名表中")
+        rows = [table.row(i)]
+    else:
+        rows = table.rows(top, offset)
+    body = _dumps({"metric": metric_name, "top": top, "offset": offset, "total": len(table), "rows": rows})
+    return _query_response(request, body, csv_fp)
 
 
 # —— 6. Organic Framework 模块 ——
 
 @app.get("/api/organic/elements")
-def get_organic_elements():
+async def get_organic_elements(request: Request):
     """
     返回 Cytoscape.js 需要的 elements 部分（nodes + edges）。
     直接从 data/organic/organic_full.cyjs 里读取整个 JSON，解析后取出 "elements" 键对应的内容并返回。
@@ -130,23 +1342,20 @@ def get_organic_elements():
     cyjs_fp = DATA_DIR / "organic" / "organic_full.cyjs"
     if not cyjs_fp.exists():
         raise HTTPException(status_code=404, detail="organic_full.cyjs not found")
-    # 1. 先将文件内容读为字符串
-    raw_str = cyjs_fp.read_text(encoding="utf8")
-    # 2. 把它解析成 Python 的 dict
+    # 1. 读取并解析成 Python 的 dict（解析结果按文件缓存）
     try:
-        full_dict = json.loads(raw_str)
+        full_dict = await CACHE.aget(cyjs_fp, _read_json)
     except json.JSONDecodeError:
         raise HTTPException(status_code=500, detail="Failed to parse organic_full.cyjs as JSON")
-    # 3. 从 dict 中取出 "elements" 部分
-    elements_obj = full_dict.get("elements", None)
-    if elements_obj is None:
+    # 2. 检查 "elements" 部分是否存在
+    if full_dict.get("elements", None) is None:
         raise HTTPException(status_code=500, detail="字段 'elements' 不存在于 organic_full.cyjs 中")
-    # 4. 以一个 dict 返回，FastAPI 会自动把它序列化为 JSON 字符串
-    return {"elements": elements_obj}
+    # 3. 返回预先编码好的 {"elements": ...} bytes
+    return await _cached_response(request, cyjs_fp, _elements_body, CACHE_CONTROL_NETWORK)
 
 
 @app.get("/api/organic/style")
-def get_organic_style():
+async def get_organic_style(request: Request):
     """
     返回 Cytoscape.js 的样式数组（style 配置）。
     直接从 data/organic/organic_style.json 里读取并解析，
@@ -155,16 +1364,14 @@ def get_organic_style():
     style_fp = DATA_DIR / "organic" / "organic_style.json"
     if not style_fp.exists():
         raise HTTPException(status_code=404, detail="organic_style.json not found")
-    raw_style = style_fp.read_text(encoding="utf8")
     try:
-        style_list = json.loads(raw_style)
+        return await _cached_response(request, style_fp, _json_body, CACHE_CONTROL_STYLE)
     except json.JSONDecodeError:
         raise HTTPException(status_code=500, detail="Failed to parse organic_style.json as JSON")
-    return style_list
 
 
 @app.get("/api/organic/nodes")
-def get_organic_nodes():
+async def get_organic_nodes(request: Request):
     """
     返回 data/organic 下的节点表格内容：
       - 优先读取 organic_nodes.xlsx
@@ -179,23 +1386,20 @@ def get_organic_nodes():
 
     if xlsx_fp.exists():
         try:
-            df = pd.read_excel(xlsx_fp, dtype=str).fillna("")
+            return await _cached_response(request, xlsx_fp, _records_body("nodes"), CACHE_CONTROL_TABLE)
         except Exception:
             raise HTTPException(status_code=500, detail="Failed to read organic_nodes.xlsx")
     elif csv_fp.exists():
         try:
-            df = pd.read_csv(csv_fp, dtype=str).fillna("")
+            return await _cached_response(request, csv_fp, _records_body("nodes"), CACHE_CONTROL_TABLE)
         except Exception:
             raise HTTPException(status_code=500, detail="Failed to read organic_nodes.csv")
     else:
         raise HTTPException(status_code=404, detail="organic nodes 文件未找到 (xlsx 或 csv)")
 
-    records = df.to_dict(orient="records")
-    return JSONResponse(content={"nodes": records})
-
 
 @app.get("/api/organic/edges")
-def get_organic_edges():
+async def get_organic_edges(request: Request, format: str = FORMAT_QUERY):
     """
     返回 data/organic 下的边表格内容：
       - 优先读取 organic_edges.xlsx
@@ -204,32 +1408,31 @@ def get_organic_edges():
       {
         "edges": [ {…}, {…}, … ]
       }
+    format=ndjson / csv 时改为逐块流式输出每一行。
     """
     xlsx_fp = DATA_DIR / "organic" / "organic_edges.xlsx"
     csv_fp  = DATA_DIR / "organic" / "organic_edges.csv"
 
     if xlsx_fp.exists():
-        try:
-            df = pd.read_excel(xlsx_fp, dtype=str).fillna("")
-        except Exception:
-            raise HTTPException(status_code=500, detail="Failed to read organic_edges.xlsx")
+        fp = xlsx_fp
     elif csv_fp.exists():
-        try:
-            df = pd.read_csv(csv_fp, dtype=str).fillna("")
-        except Exception:
-            raise HTTPException(status_code=500, detail="Failed to read organic_edges.csv")
+        fp = csv_fp
     else:
         raise HTTPException(status_code=404, detail="organic edges 文件未找到 (xlsx 或 csv)")
 
-    records = df.to_dict(orient="records")
-    return JSONResponse(content={"edges": records})
+    try:
+        if format != "json":
+            return _streaming_response(await CACHE.aget(fp, _read_columnar), format)
+        return await _cached_response(request, fp, _records_body("edges"), CACHE_CONTROL_TABLE)
+    except Exception:
+        raise HTTPException(status_code=500, detail=f"Failed to read {fp.name}")
 
 # —— 7. Subtype Networks 模块 ——
 # ------------------------------------------------------------
 # 1. 列出所有可用的 subtype tags
 # ------------------------------------------------------------
 @app.get("/api/subtype")
-def list_subtypes():
+async def list_subtypes():
     """
     列出 data/subtype 文件夹下所有 .cyjs 文件（去掉后缀后的文件名作为 tag）。
     返回：{ "subtypes": ["luminal_original", "luminal_aug", ...] }
@@ -245,23 +1448,23 @@ def list_subtypes():
 # 2. /api/subtype/{tag} —— 直接下载 / 查看 整个 .cyjs 文件
 # ------------------------------------------------------------
 @app.get("/api/subtype/{tag}")
-def download_subtype_cyjs(tag: str):
+async def download_subtype_cyjs(request: Request, tag: str):
     """
     返回整个 data/subtype/{tag}.cyjs 文件（Cytoscape.js JSON），
-    前端可以用 FileResponse 直接下载或打开。
+    前端可以直接下载或打开（客户端支持时返回预压缩版本）。
     """
     cyjs_fp = DATA_DIR / "subtype" / f"{tag}.cyjs"
     if not cyjs_fp.exists():
         raise HTTPException(status_code=404, detail=f"子网 JSON 未找到: {tag}.cyjs")
     # 直接让浏览器下载或打开这个 .cyjs 文件
-    return FileResponse(cyjs_fp, media_type="application/json")
+    return await _cached_response(request, cyjs_fp, _read_bytes, CACHE_CONTROL_NETWORK)
 
 
 # ------------------------------------------------------------
 # 3. /api/subtype/{tag}/elements —— 只返回 .cyjs 中的 "elements" 部分
 # ------------------------------------------------------------
 @app.get("/api/subtype/{tag}/elements")
-def get_subtype_elements(tag: str):
+async def get_subtype_elements(request: Request, tag: str):
     """
     例如 GET /api/subtype/luminal_original/elements
     读取 data/subtype/{tag}.cyjs 文件，把它 parse 成 Python dict，然后只提取 "elements" 键。
@@ -270,23 +1473,18 @@ def get_subtype_elements(tag: str):
     cyjs_fp = DATA_DIR / "subtype" / f"{tag}.cyjs"
     if not cyjs_fp.exists():
         raise HTTPException(status_code=404, detail=f"{tag}.cyjs not found")
-    raw_str = cyjs_fp.read_text(encoding="utf8")
     try:
-        full_dict = json.loads(raw_str)
+        # 如果 .cyjs 文件里没有 "elements" 字段，就返回空数组
+        return await _cached_response(request, cyjs_fp, _elements_body, CACHE_CONTROL_NETWORK)
     except json.JSONDecodeError:
         raise HTTPException(status_code=500, detail=f"{tag}.cyjs 内容不是合法的 JSON")
-    elements_list = full_dict.get("elements")
-    if elements_list is None:
-        # 如果 .cyjs 文件里没有 "elements" 字段，就返回空数组
-        return {"elements": []}
-    return {"elements": elements_list}
 
 
 # ------------------------------------------------------------
 # 4. /api/subtype/{tag}/style —— 返回 .cyjs 中的样式（从 style.json 拿）
 # ------------------------------------------------------------
 @app.get("/api/subtype/{tag}/style")
-def get_subtype_style(tag: str):
+async def get_subtype_style(request: Request, tag: str):
     """
     例如 GET /api/subtype/luminal_original/style
     读取 data/subtype/{tag}_style.json 文件，解析后直接返回给前端。
@@ -299,19 +1497,17 @@ def get_subtype_style(tag: str):
     style_fp = DATA_DIR / "subtype" / f"{tag}_style.json"
     if not style_fp.exists():
         raise HTTPException(status_code=404, detail=f"{tag}_style.json not found")
-    raw_str = style_fp.read_text(encoding="utf8")
     try:
-        style_obj = json.loads(raw_str)
+        return await _cached_response(request, style_fp, _json_body, CACHE_CONTROL_STYLE)
     except json.JSONDecodeError:
         raise HTTPException(status_code=500, detail=f"{tag}_style.json 内容不是合法的 JSON")
-    return style_obj
 
 
 # ------------------------------------------------------------
 # 5. /api/subtype/{tag}/nodes —— 返回节点表的 JSON 数组
 # ------------------------------------------------------------
 @app.get("/api/subtype/{tag}/nodes")
-def get_subtype_nodes(tag: str):
+async def get_subtype_nodes(request: Request, tag: str):
     """
     读取 data/subtype/{tag}_nodes.csv 文件，将其转成 JSON 数组返回：
       { "nodes": [ {col1: val1, col2: val2, ...}, {...}, ... ] }
@@ -319,21 +1515,265 @@ def get_subtype_nodes(tag: str):
     nodes_fp = DATA_DIR / "subtype" / f"{tag}_nodes.csv"
     if not nodes_fp.exists():
         raise HTTPException(status_code=404, detail=f"子网节点文件未找到: {tag}_nodes.csv")
-    df = pd.read_csv(nodes_fp, dtype=str).fillna("")
-    return {"nodes": df.to_dict(orient="records")}
+    return await _cached_response(request, nodes_fp, _records_body("nodes"), CACHE_CONTROL_TABLE)
 
 
 # ------------------------------------------------------------
 # 6. /api/subtype/{tag}/edges —— 返回边表的 JSON 数组
 # ------------------------------------------------------------
 @app.get("/api/subtype/{tag}/edges")
-def get_subtype_edges(tag: str):
+async def get_subtype_edges(request: Request, tag: str, format: str = FORMAT_QUERY):
     """
     读取 data/subtype/{tag}_edges.csv 文件，将其转成 JSON 数组返回：
       { "edges": [ {col1: val1, col2: val2, ...}, {...}, ... ] }
+    format=ndjson / csv 时改为逐块流式输出每一行。
     """
     edges_fp = DATA_DIR / "subtype" / f"{tag}_edges.csv"
     if not edges_fp.exists():
         raise HTTPException(status_code=404, detail=f"子网边文件未找到: {tag}_edges.csv")
-    df = pd.read_csv(edges_fp, dtype=str).fillna("")
-    return {"edges": df.to_dict(orient="records")}
+    if format != "json":
+        return _streaming_response(await CACHE.aget(edges_fp, _read_columnar), format)
+    return await _cached_response(request, edges_fp, _records_body("edges"), CACHE_CONTROL_TABLE)
+
+
+# ------------------------------------------------------------
+# 7. /api/subtype/{tag}/centrality —— 子网中心性（增强子网为增量更新的结果）
+# ------------------------------------------------------------
+def _subtype_centrality(fp: Path):
+    """
+    由子网边表得到 (观测边上的中心性状态, 加入预测连边后的状态, 预测连边数)；
+    没有预测连边时两个状态相同。
+    """
+    observed, predicted = read_edge_frame(fp)
+    base = CentralityState.build(GeneGraph.from_frame(observed))
+    if not len(predicted):
+        return base, base, 0
+    return base, base.apply(predicted["source"], predicted["target"], predicted["weight"]), len(predicted)
+
+
+def _subtype_edges_fp(tag: str) -> Path:
+    edges_fp = DATA_DIR / "subtype" / f"{tag}_edges.csv"
+    if not edges_fp.exists():
+        raise HTTPException(status_code=404, detail=f"{tag}_edges.csv not found")
+    return edges_fp
+
+
+def _parse_metrics(metrics: str) -> list:
+    names = [m.strip() for m in metrics.split(",") if m.strip()]
+    unknown = [m for m in names if m not in METRIC_COLUMNS]
+    if not names or unknown:
+        raise HTTPException(status_code=400, detail=f"未知的指标 (unknown metrics): {unknown or metrics}")
+    return names
+
+
+def _centrality_rows(base: CentralityState, state: CentralityState, names: list, genes) -> list:
+    """
+    state 上各指标的名次与数值；给出 base 时每行附带相对 base 的 "<metric>_change"
+    （base 中没有的基因为 None）。
+    """
+    vals = state.values()
+    rows = join_rows([CentralityTable(m, state.graph.names, vals[m]) for m in names], genes)
+    if base is None:
+        return rows
+    base_vals = base.values()
+    for row in rows:
+        i = base.graph.node_id(row["gene"])
+        for m in names:
+            if i is None or row[m] is None:
+                row[f"{m}_change"] = None
+            else:
+                row[f"{m}_change"] = row[m] - float(base_vals[m][i])
+    return rows
+
+
+@app.get("/api/subtype/{tag}/centrality")
+async def get_subtype_centrality(
+    request: Request,
+    tag: str,
+    metrics: str = Query(",".join(METRIC_COLUMNS), description="逗号分隔的指标，行按第一个指标排名"),
+    top: int = Query(30, ge=1, description="返回前 N 名"),
+    offset: int = Query(0, ge=0, description="跳过前 offset 名"),
+    gene: str = Query(None, description="只返回该基因的一行"),
+):
+    """
+    子网 {tag} 的加权中心性（degree / betweenness / closeness / eigenvector），由边表现算并缓存。
+    增强子网（边表中含 new_gene / old_gene 预测连边）以观测边为基础、把预测连边作为增量加入，
+    每行额外给出 "<metric>_change"：接受预测连边后的数值变化（新加入的基因为 None）。
+      { "tag", "metrics", "nodes", "edges", "predicted_links", "recomputed_sources", "total",
+        "rows": [ {"gene", "degree", "degree_rank", "degree_change", ...}, ... ] }
+    例：
+      GET /api/subtype/tnbc_aug/centrality?metrics=betweenness,degree&top=10
+    """
+    edges_fp = _subtype_edges_fp(tag)
+    names = _parse_metrics(metrics)
+    base, aug, n_predicted = await CACHE.aget(edges_fp, _subtype_centrality)
+    ranked = CentralityTable(names[0], aug.graph.names, aug.values()[names[0]])
+    genes = [gene] if gene is not None else ranked.genes[offset:offset + top]
+    rows = _centrality_rows(base if n_predicted else None, aug, names, genes)
+    body = _dumps({
+        "tag": tag,
+        "metrics": names,
+        "nodes": aug.graph.n_nodes,
+        "edges": aug.graph.n_edges,
+        "predicted_links": n_predicted,
+        "recomputed_sources": aug.recomputed if n_predicted else 0,
+        "total": len(ranked),
+        "rows": rows,
+    })
+    return _query_response(request, body, edges_fp)
+
+
+# 单次假设分析最多接受的新增边数
+CENTRALITY_DELTA_MAX = 500
+
+
+@app.post("/api/subtype/{tag}/centrality")
+async def post_subtype_centrality_delta(
+    tag: str,
+    edges: List[Tuple[str, str, float]] = Body(..., embed=True,
+                                               description=f"新增边 [基因A, 基因B, 权重]，最多 {CENTRALITY_DELTA_MAX} 条"),
+    metrics: str = Body(",".join(METRIC_COLUMNS), embed=True, description="逗号分隔的指标，行按第一个指标排名"),
+    top: int = Body(30, embed=True, ge=1, description="返回前 N 名"),
+):
+    """
+    假设分析：在子网 {tag}（增强子网为已加入预测连边的状态）上再加入请求体给出的边，
+    增量更新中心性并返回新的排名，每行的 "<metric>_change" 为相对加边前的变化：
+      { "tag", "metrics", "added_edges", "nodes", "edges", "recomputed_sources", "total", "rows": [...] }
+    请求体例：{"edges": [["CDK4", "ESR1", 2], ["TP53", "NEWGENE", 1]], "metrics": "betweenness,degree", "top": 10}
+    不在子网中的基因作为新节点加入；已存在的边、重复边与自环被忽略（不计入 added_edges）。
+    只有从新边端点出发最短路径会变的源点被重算；受影响源点过半时退回全部重算，
+    几十个节点的子网上这是常态，recomputed_sources 给出实际重算的源点数。
+    """
+    if len(edges) > CENTRALITY_DELTA_MAX:
+        raise HTTPException(status_code=400, detail=f"单次最多加入 {CENTRALITY_DELTA_MAX} 条边 (too many edges): {len(edges)}")
+    if any(w <= 0 for _, _, w in edges):
+        raise HTTPException(status_code=400, detail="边权重必须为正数 (edge weights must be positive)")
+    edges_fp = _subtype_edges_fp(tag)
+    names = _parse_metrics(metrics)
+    _, aug, _ = await CACHE.aget(edges_fp, _subtype_centrality)
+    sources, targets, weights = ([e[i] for e in edges] for i in range(3))
+    # 最短路径重算放到线程池里执行，不阻塞事件循环
+    loop = asyncio.get_running_loop()
+    state = await loop.run_in_executor(LOAD_EXECUTOR, aug.apply, sources, targets, weights)
+    ranked = CentralityTable(names[0], state.graph.names, state.values()[names[0]])
+    body = _dumps({
+        "tag": tag,
+        "metrics": names,
+        "added_edges": state.graph.n_edges - aug.graph.n_edges,
+        "nodes": state.graph.n_nodes,
+        "edges": state.graph.n_edges,
+        "recomputed_sources": state.recomputed,
+        "total": len(ranked),
+        "rows": _centrality_rows(aug, state, names, ranked.genes[:top]),
+    })
+    return Response(content=body, media_type="application/json", headers={"Cache-Control": CACHE_CONTROL_QUERY})
+
+
+# —— 8. 启动预加载 & 健康检查 ——
+_STARTUP = {"ready": False, "loaded": 0, "errors": [], "seconds": None}
+
+
+def _preload_targets() -> list:
+    """
+    列出需要预热的 (文件, loader) 组合，与各端点实际使用的 loader 一致，
+    预热后首个请求即可直接命中缓存。
+    """
+    targets = []
+
+    def add(fp: Path, *loaders):
+        if fp.exists():
+            targets.extend((fp, loader) for loader in loaders)
+
+    add(KB_FP, _records_body("records"), _read_columnar, _entity_index, _trigram_index, _kb_prefix_index)
+    add(NETWORK_CYJS_FP, _read_bytes, _cyjs_node_index, _cyjs_edge_index, _network_prefix_index)
+    add(EDGES_FP, GeneGraph.from_edges_csv)
+    if COMMUNITIES_FP.exists():
+        add(COMMUNITIES_FP, _json_body)
+    else:
+        add(EDGES_FP, _live_communities_body)
+    for fp in sorted((DATA_DIR / "centrality").glob("*.csv")):
+        add(fp, CentralityTable.from_csv)
+
+    organic = DATA_DIR / "organic"
+    add(organic / "organic_full.cyjs", _elements_body)
+    add(organic / "organic_style.json", _json_body)
+    for kind in ("nodes", "edges"):
+        xlsx_fp = organic / f"organic_{kind}.xlsx"
+        fp = xlsx_fp if xlsx_fp.exists() else organic / f"organic_{kind}.csv"
+        add(fp, _records_body(kind))
+        if kind == "edges":
+            add(fp, _read_columnar)   # 流式输出用
+
+    subtype = DATA_DIR / "subtype"
+    for cyjs_fp in sorted(subtype.glob("*.cyjs")):
+        tag = cyjs_fp.stem
+        add(cyjs_fp, _read_bytes, _elements_body)
+        add(subtype / f"{tag}_style.json", _json_body)
+        add(subtype / f"{tag}_nodes.csv", _records_body("nodes"))
+        add(subtype / f"{tag}_edges.csv", _records_body("edges"), _read_columnar)
+    return targets
+
+
+def _warm(fp: Path, loader):
+    """
+    加载一个资源，并预先生成它的派生数据：
+      - bytes 响应体：内容哈希（ETag）与各压缩版本；
+      - 列式表格：全部列的过滤索引。
+    """
+    value = CACHE.get(fp, loader)
+    if isinstance(value, bytes):
+        CACHE.get(fp, _hashed(loader))
+        if len(value) >= MIN_COMPRESS_SIZE:
+            for encoding in _COMPRESSORS:
+                CACHE.get(fp, _compressed(loader, encoding))
+    elif isinstance(value, KBTable):
+        for col in value.columns:
+            value.value_index(col)
+        value.label_index()
+
+
+async def _preload_all():
+    """
+    在冷加载线程池（resource_cache.LOAD_EXECUTOR）上并行预热全部资源；
+    单个资源失败只记录错误，不阻止实例就绪。
+    """
+    start = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    targets = _preload_targets()
+    results = await asyncio.gather(
+        *(loop.run_in_executor(LOAD_EXECUTOR, _warm, fp, loader) for fp, loader in targets),
+        return_exceptions=True,
+    )
+    for (fp, loader), result in zip(targets, results):
+        if isinstance(result, Exception):
+            logger.warning("preload failed: %s (%s): %s", fp, loader.__qualname__, result)
+            _STARTUP["errors"].append(f"{fp.relative_to(DATA_DIR)}: {result}")
+        else:
+            _STARTUP["loaded"] += 1
+    _STARTUP["seconds"] = round(time.perf_counter() - start, 3)
+    _STARTUP["ready"] = True
+    logger.info("preload finished: %d resources in %.2fs", _STARTUP["loaded"], _STARTUP["seconds"])
+
+
+@app.get("/healthz")
+async def healthz():
+    """
+    存活检查：进程能响应即返回 200。
+    """
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    """
+    就绪检查：启动预加载完成后返回 200，之前返回 503，供负载均衡器决定是否导入流量。
+    """
+    body = {
+        "status": "ready" if _STARTUP["ready"] else "warming",
+        "loaded": _STARTUP["loaded"],
+        "errors": _STARTUP["errors"],
+        "seconds": _STARTUP["seconds"],
+        "cache": CACHE.info(),
+    }
+    return Response(content=_dumps(body), media_type="application/json",
+                    status_code=200 if _STARTUP["ready"] else 503)
@@ -1,5 +1,6 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import glob
 import json
 import os
@@ -11,6 +12,9 @@ from venn import venn
 import re
 from graphviz import Digraph
 import requests  # 用于向本地/远端 FastAPI 请求 JSON
+from graph_index import GeneGraph
+from kb_search import EntityIndex, PrefixIndex, TrigramIndex, tokenize
+from kb_table import LabelCodeIndex
 
 ################################################################################
 # --------------------------  FUNCTIONS & HELPERS  ----------------------------
@@ -34,10 +38,75 @@ def load_excel(path: Path):
         return pd.read_excel(path)
     return None
 
-def build_dot_with_links(lines):
+@st.cache_resource(show_spinner=False)
+def load_gene_graph(path: Path):
+    """
+    由共现边表构建 GeneGraph（邻居已按权重降序预排）。如果文件不存在，返回 None。
+    """
+    if path.exists():
+        return GeneGraph.from_edges_csv(path)
+    return None
+
+@st.cache_resource(show_spinner=False)
+def load_entity_index(path: Path):
+    """
+    知识库实体列的倒排索引（实体 → 行号数组），每个进程只构建一次。如果文件不存在，返回 None。
+    """
+    df = load_csv(path)
+    if df is None:
+        return None
+    return EntityIndex(df)
+
+@st.cache_resource(show_spinner=False)
+def load_trigram_index(path: Path):
+    """
+    实体取值的三元组索引，用于容错检索与按相关度排序的候选列表。如果文件不存在，返回 None。
+    """
+    index = load_entity_index(path)
+    if index is None:
+        return None
+    return TrigramIndex(index)
+
+@st.cache_resource(show_spinner=False)
+def load_prefix_index(path: Path):
+    """
+    实体取值的前缀补全表（按命中行数排序），与 /api/suggest 使用同一个 PrefixIndex。如果文件不存在，返回 None。
+    """
+    index = load_entity_index(path)
+    if index is None:
+        return None
+    return PrefixIndex.from_entity_index(index)
+
+@st.cache_resource(show_spinner=False)
+def _api_response_cache() -> dict:
+    """
+    跨 rerun 共享的 API 响应缓存：{url: (ETag, 响应 bytes)}。
+    """
+    return {}
+
+def api_get_json(url: str):
+    """
+    GET 一个 API 端点并解析 JSON。带上次响应的 ETag 发起条件请求，
+    服务器返回 304 时直接复用本地缓存的内容，不再重新下载整个网络 JSON。
+    每次都从 bytes 重新解析，调用方可以放心修改返回的对象。
+    """
+    cache = _api_response_cache()
+    cached = cache.get(url)
+    headers = {"If-None-Match": cached[0]} if cached else {}
+    resp = requests.get(url, headers=headers, timeout=60)
+    if resp.status_code == 304 and cached:
+        return json.loads(cached[1])
+    resp.raise_for_status()
+    etag = resp.headers.get("ETag")
+    if etag:
+        cache[url] = (etag, resp.content)
+    return json.loads(resp.content)
+
+def build_dot_with_links(lines, counts: dict = None):
     """
     根据 knowledge_map.txt 的行，构造一个有 URL 链接的 Graphviz 图。
     每个节点形如 "1.2.3.4 说明文字"，点击节点会在 URL 上附加 ?node=1.2.3.4
+    counts 为 {编号: 子树行数} 时，在节点标签后标注该编号下的记录数。
     """
     dot = Digraph(format='svg')
     dot.attr(
@@ -66,6 +135,8 @@ def build_dot_with_links(lines):
         code = m.group(1)
         desc = m.group(2) or ''
         label = f"{code} {desc}"
+        if counts is not None:
+            label += f" ({counts.get(code, 0)})"
 
         dot.node(
             code,
@@ -82,29 +153,26 @@ def build_dot_with_links(lines):
 
     return dot
 
-def filter_by_node_code(df: pd.DataFrame, selected_code: str) -> pd.DataFrame:
+@st.cache_resource(show_spinner=False)
+def load_label_index(path: Path):
     """
-    根据 selected_code 里面的“.”数量（即层级），选择相应的标签列来做 == 筛选。
-    例如：
-      selected_code="1"               → 一级节点，选 df["一级标签"] == selected_code
-      selected_code="1.2"             → 二级节点，选 df["二级标签"] == selected_code
-      selected_code="1.2.3"           → 三级节点，选 df["三级标签"] == selected_code
-      selected_code="1.2.3.4"         → 四级节点，选 df["四级标签"] == selected_code
-      selected_code="1.2.3.4.5"       → 五级节点，选 df["五级标签"] == selected_code
-    如果 df 中没有对应列，则返回空 DataFrame。
+    标签编号的层级索引（编号 → 子树行号数组，含各编号的行数汇总），每个进程只构建一次。
+    如果文件不存在，返回 None。
     """
-    depth = selected_code.count(".") + 1
-    col_map = {
-        1: "一级标签",
-        2: "二级标签",
-        3: "三级标签",
-        4: "四级标签",
-        5: "五级标签"
-    }
-    col_name = col_map.get(depth)
-    if col_name is None or col_name not in df.columns:
-        return df.iloc[0:0]
-    return df[df[col_name] == selected_code]
+    df = load_csv(path)
+    if df is None:
+        return None
+    return LabelCodeIndex.from_frame(df)
+
+def filter_by_node_code(df: pd.DataFrame, selected_code: str, index: LabelCodeIndex,
+                        descendants: bool = True) -> pd.DataFrame:
+    """
+    按标签编号筛选 df（df 须与 index 来自同一张表）：
+      descendants=True  → 返回编号所在子树的全部行，例如 "1.4" 命中 1.4、1.4.1、1.4.1.2 …
+      descendants=False → 只返回以该编号为最具体标签的行
+    行号直接取自预先建好的层级索引，不再对整列做 == 比较。
+    """
+    return df.iloc[index.rows(selected_code, descendants)]
 
 ################################################################################
 # -----------------------------  PAGE SETTINGS  --------------------------------
@@ -189,10 +257,12 @@ if page.startswith("1."):
 
     # 点击知识图谱节点以后，用 ?node=xxx 来筛选 table
     params   = st.query_params
-    selected = params.get("node", [None])[0]
+    selected = params.get("node")
+    label_index = load_label_index(csv_fp)
     if selected:
         st.markdown(f"**🔍 已选节点：{selected} | Selected Node: {selected}**")
-        df_sel = filter_by_node_code(df, selected)
+        with_desc = st.checkbox("包含全部子节点 | Include all descendants", value=True, key="node_desc_stats")
+        df_sel = filter_by_node_code(df, selected, label_index, with_desc)
         if not df_sel.empty:
             st.dataframe(df_sel, use_container_width=True, hide_index=True)
         else:
@@ -203,7 +273,7 @@ if page.startswith("1."):
     km_file = RAW_DIR / "knowledge_map.txt"
     if km_file.exists():
         lines = km_file.read_text(encoding="utf-8").splitlines()
-        dot   = build_dot_with_links(lines)
+        dot   = build_dot_with_links(lines, {x["code"]: x["subtree_rows"] for x in label_index.counts()})
         st.graphviz_chart(dot.source, use_container_width=True)
     else:
         st.info("请将 knowledge_map.txt 放到 raw_data/ 下并重启应用 (Please place knowledge_map.txt into raw_data/ and restart)。")
@@ -283,22 +353,56 @@ elif page.startswith("2."):
         placeholder="例如 / e.g.: CDK4"
     ).strip()
 
+    # 2.3 前缀补全：在本地知识库的前缀补全表上按频次给出补全建议，选中后替换输入的关键词
+    kb_fp = DATA_DIR / "stats" / "cdk4_6_kb.csv"
+    prefix_index = load_prefix_index(kb_fp) if term and len(tokenize(term)) == 1 else None
+    if prefix_index is not None:
+        suggestions = prefix_index.suggest(col_choice.split("|")[0].strip(), term)
+        counts = {x["value"]: x["count"] for x in suggestions if x["value"].casefold() != term.casefold()}
+        if counts:
+            completion = st.selectbox(
+                "补全建议（按出现频次排序） | Completions (by frequency):",
+                ["(· 保持输入 ·)"] + list(counts),
+                format_func=lambda v: f"{v}  ({counts[v]})" if v in counts else v
+            )
+            if completion != "(· 保持输入 ·)":
+                term = completion
+
     if term:
-        # 2.3 读取知识库表格
-        kb_fp = DATA_DIR / "stats" / "cdk4_6_kb.csv"
+        # 2.4 读取知识库表格
         df_kb = load_csv(kb_fp)
         if df_kb is None:
             st.error("⚠ 无法加载 cdk4_6_kb.csv，请确保已放到 data/stats/ 下 (Cannot load cdk4_6_kb.csv; please place it under data/stats/).")
             st.stop()
 
-        # 2.4 拆分出真正的列名（去掉“|”后面的中文）
+        # 2.5 拆分出真正的列名（去掉“|”后面的中文），在索引中检索命中的行号
         actual_col = col_choice.split("|")[0].strip()
-        df_filt = df_kb[df_kb[actual_col].astype(str).str.contains(term, case=False, na=False)]
+        kb_index = load_entity_index(kb_fp)
+        if len(tokenize(term)) > 1:
+            # 逗号分隔的多个实体：要求同时命中
+            rows = kb_index.search(actual_col, term)
+        else:
+            # 子串命中的行全部保留（与原先的 str.contains 过滤结果相同）；三元组索引只在其上
+            # 补充拼写相近、但不包含关键词的实体，由用户勾选后并入。没有子串命中时默认选中最相似的一个
+            rows = kb_index.search(actual_col, term)
+            candidates = load_trigram_index(kb_fp).search(term, [actual_col], limit=20, matches=("fuzzy",))
+            options = {
+                f"{c['value']}  ({c['rows']} rows, sim={c['similarity']:.2f})": c
+                for c in candidates
+            }
+            default = [] if len(rows) else list(options)[:1]
+            chosen = st.multiselect(
+                "拼写相近的实体（按相似度排序，勾选后并入结果） | Similar entities (ranked by similarity, added when selected):",
+                list(options), default=default
+            )
+            parts = [rows] + [kb_index.lookup(actual_col, options[k]["key"]) for k in chosen]
+            rows = np.unique(np.concatenate(parts))
+        df_filt = df_kb.iloc[rows]
         if df_filt.empty:
-            st.warning(f"未找到在 `{actual_col}` 列中包含 “{term}” 的任何记录 | No records found in `{actual_col}` containing “{term}`.")
+            st.warning(f"未找到在 `{actual_col}` 列中匹配 “{term}” 的任何记录 | No records found in `{actual_col}` matching “{term}`.")
             st.stop()
         else:
-            st.success(f"🔍 找到 {len(df_filt)} 条记录。（`{actual_col}` 中包含 “{term}”） | Found {len(df_filt)} record(s) where `{actual_col}` contains `{term}`.")
+            st.success(f"🔍 找到 {len(df_filt)} 条记录。（`{actual_col}` 中匹配 “{term}”） | Found {len(df_filt)} record(s) where `{actual_col}` matches `{term}`.")
             st.dataframe(df_filt, use_container_width=True, hide_index=True)
 
         # —— 3. 构建子网元素 ——
@@ -330,7 +434,27 @@ elif page.startswith("2."):
                     a, b = sorted((vals[i], vals[j]))
                     edges.add((a, b))
 
-        # 3.3 转成 Cytoscape.js 所需格式
+        # 3.3 为子网中的基因补上全局共现网络里最强的 top-k 邻居（邻居表已按权重降序，取前 k 个即可）
+        top_k = st.slider(
+            "每个基因补充的最强共现邻居数 | Strongest co-occurring neighbors added per gene:",
+            min_value=0, max_value=10, value=3
+        )
+        cooccur = {}
+        graph = load_gene_graph(DATA_DIR / "network" / "gene_cooccurrence_edges.csv")
+        if graph is not None and top_k > 0:
+            for g in [v for v, c in node_type.items() if c == "Gene Symbol"]:
+                i = graph.node_id(g)
+                if i is None:
+                    continue
+                nbr, w = graph.neighbors(i, limit=top_k)
+                for j, x, r in zip(nbr.tolist(), w.tolist(), graph.weight_share(i, w).tolist()):
+                    nb = graph.names[j]
+                    node_type.setdefault(nb, "Gene Symbol")
+                    a, b = sorted((g, nb))
+                    if (a, b) not in edges:
+                        cooccur[(a, b)] = (x, r)
+
+        # 3.4 转成 Cytoscape.js 所需格式
         elements = []
         for node_name, typ in node_type.items():
             elements.append({
@@ -338,6 +462,8 @@ elif page.startswith("2."):
             })
         for s, t in edges:
             elements.append({"data": {"source": s, "target": t}})
+        for (s, t), (x, r) in cooccur.items():
+            elements.append({"data": {"source": s, "target": t, "kind": "cooccur", "weight": x, "share": r}})
 
         # —— 4. 子网样式 ——
         style_sub = [
@@ -393,6 +519,13 @@ elif page.startswith("2."):
                     "width":       1,
                     "line-color":  "#ccc"
                 }
+            },
+            {
+                "selector": "edge[kind='cooccur']",
+                "style": {
+                    "line-style":  "dashed",
+                    "line-color":  "#9C27B0"
+                }
             }
         ]
 
@@ -499,14 +632,8 @@ elif page.startswith("2."):
             ["(· 请选择 ·)"] + node_list
         )
         if chosen_node != "(· 请选择 ·)":
-            mask = (
-                df_filt["Gene Symbol"].astype(str).str.contains(chosen_node, case=False, na=False)
-                | df_filt["Cell type"].astype(str).str.contains(chosen_node, case=False, na=False)
-                | df_filt["Disease"].astype(str).str.contains(chosen_node, case=False, na=False)
-                | df_filt["Drugs"].astype(str).str.contains(chosen_node, case=False, na=False)
-                | df_filt["Pathway"].astype(str).str.contains(chosen_node, case=False, na=False)
-            )
-            df_second = df_filt[mask]
+            rows = kb_index.search_any(chosen_node, cols)
+            df_second = df_filt[df_filt.index.isin(rows)]
             if df_second.empty:
                 st.warning(f"⚠ 二次筛选后，没有找到任何在 5 列中包含 “{chosen_node}” 的记录 | No records found in any of the 5 columns containing `{chosen_node}` after secondary filtering.")
             else:
@@ -536,6 +663,9 @@ elif page.startswith("3."):
         st.error("⚠ data/centrality 下未找到任何 CSV 文件 | No centrality CSV files found in data/centrality/.")
         st.stop()
 
+    # 完整排名表包含全部基因；图表沿用已发布的“前 32 名”口径：
+    # 去掉查询基因 CDK4 / CDK6 后取前 30 名画柱状图与维恩图
+    query_genes = {"CDK4", "CDK6"}
     top_sets = {}
     for fp in files:
         fp_path = Path(fp)
@@ -565,7 +695,8 @@ elif page.startswith("3."):
         metric_name = val_col.replace("_", " ").replace("(Weight)", "").strip().title()
         st.subheader(f"{metric_name} (Top 30)")
 
-        sub = df2.head(30)
+        ranked = df2[~df2["gene"].isin(query_genes)]
+        sub = ranked.head(30)
         chart = (
             alt.Chart(sub)
                .mark_bar(size=18)
@@ -582,7 +713,7 @@ elif page.startswith("3."):
             df2.to_csv(index=False).encode("utf-8"),
             f"{metric_name}.csv"
         )
-        top_sets[metric_name] = set(df2["gene"].head(32))
+        top_sets[metric_name] = set(ranked["gene"].head(30))
 
     if len(top_sets) == 4:
         st.markdown("### 🔗 Venn Diagram of Top-32 Genes Across Metrics / 四大指标前32基因维恩图")
@@ -601,15 +732,18 @@ elif page.startswith("3."):
     km2 = Path("raw_data") / "updated_knowledge_map_corrected.txt"
     if km2.exists():
         lines2 = km2.read_text(encoding="utf-8").splitlines()
-        dot2   = build_dot_with_links(lines2)
+        label_index = load_label_index(DATA_DIR / "stats" / "cdk4_6_kb.csv")
+        counts = {x["code"]: x["subtree_rows"] for x in label_index.counts()} if label_index else None
+        dot2   = build_dot_with_links(lines2, counts)
 
         params = st.query_params
-        sel    = params.get("node", [None])[0]
+        sel    = params.get("node")
         if sel:
             st.markdown(f"**🔍 在 Statistics 表中定位：{sel} | Locate in Statistics table: {sel}**")
             df_stats = load_csv(DATA_DIR / "stats" / "cdk4_6_kb.csv")
             if df_stats is not None:
-                df_f = filter_by_node_code(df_stats, sel)
+                with_desc = st.checkbox("包含全部子节点 | Include all descendants", value=True, key="node_desc_centrality")
+                df_f = filter_by_node_code(df_stats, sel, label_index, with_desc)
                 if not df_f.empty:
                     st.dataframe(df_f, use_container_width=True, hide_index=True)
                 else:
@@ -635,14 +769,10 @@ elif page.startswith("4."):
 
     # —— 1. 调用 REST API 拿到 elements 和 style ——
     try:
-        resp_elems = requests.get("https://cdk46kb.onrender.com/api/organic/elements")
-        resp_elems.raise_for_status()
-        data_elems = resp_elems.json()
+        data_elems = api_get_json("https://cdk46kb.onrender.com/api/organic/elements")
         cy_elems = data_elems.get("elements", [])
 
-        resp_style = requests.get("https://cdk46kb.onrender.com/api/organic/style")
-        resp_style.raise_for_status()
-        style_all = resp_style.json()
+        style_all = api_get_json("https://cdk46kb.onrender.com/api/organic/style")
     except Exception as e:
         st.warning(
             "❗ 无法从 API 获取 Organic Framework 数据，请确认：\n"
@@ -838,9 +968,7 @@ else:
 
     # 2.1 拿 elements（节点+边）
     try:
-        resp_elem = requests.get(f"{base_url}/{key}/elements")
-        resp_elem.raise_for_status()
-        elem_dict = resp_elem.json()
+        elem_dict = api_get_json(f"{base_url}/{key}/elements")
         elements = elem_dict.get("elements", [])
     except Exception as e:
         st.error(f"❌ 无法从 API 获取 /api/subtype/{key}/elements：{e}")
@@ -848,9 +976,7 @@ else:
 
     # 2.2 拿 style（样式）
     try:
-        resp_style = requests.get(f"{base_url}/{key}/style")
-        resp_style.raise_for_status()
-        style_data = resp_style.json()
+        style_data = api_get_json(f"{base_url}/{key}/style")
         if isinstance(style_data, list) and style_data and isinstance(style_data[0], dict) and "style" in style_data[0]:
             style_list = style_data[0]["style"]
         else:
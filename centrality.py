@@ -0,0 +1,437 @@
+# centrality.py
+# 中心性指标的内存排名表：每个指标一份按数值降序排好的 float64 数组 + 基因名数组 + 基因 → 名次索引，
+# 取前 N 名是切片，查某个基因的名次是字典查找，不再每次请求重新读 CSV。
+# 另含中心性计算引擎：直接从共现边表（GeneGraph）用 NumPy / SciPy 稀疏矩阵算出全部节点的
+# 加权度、介数、接近度与特征向量中心性，供 scripts/build_data.py 生成完整排名表。
+
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse import csgraph
+from scipy.sparse.linalg import eigsh
+
+# 指标名 → 排名表 CSV 中数值列的列名（与 Cytoscape / CytoNCA 导出的表头一致）
+METRIC_COLUMNS = {
+    "degree": "Degree(Weight)",
+    "betweenness": "Betweenness(Weight)",
+    "closeness": "Closeness(Weight)",
+    "eigenvector": "Eigenvector(Weight)",
+}
+
+# 最短路径批处理时单批 “源点数 × 弧数” 的上限，控制中间矩阵的内存（每个 float64 矩阵约 8 × 该值字节）
+PATH_BATCH_CELLS = 4_000_000
+
+# 判断一条弧是否在最短路径 DAG 上时允许的相对误差（浮点距离按不同顺序累加）
+_TIE_RTOL = 1e-9
+
+# 近似介数的默认置信度（误差超过 epsilon 的概率不超过 1 - confidence）
+DEFAULT_CONFIDENCE = 0.95
+
+# 热启动幂迭代的收敛阈值（相邻两次迭代向量差的最大绝对值）与迭代上限，未收敛时退回 Lanczos
+POWER_TOL = 1e-10
+POWER_MAX_ITER = 2000
+
+
+class CentralityTable:
+    """
+    单个中心性指标的排名表。名次从 1 开始，数值相同时保持原文件中的先后顺序。
+    """
+
+    def __init__(self, metric: str, genes, values):
+        values = np.asarray(values, dtype=np.float64)
+        order = np.argsort(-values, kind="stable")
+        self.metric = metric
+        self.genes = np.asarray(genes, dtype=object)[order]
+        self.values = values[order]
+        # 基因名不区分大小写查找
+        self._index = {str(g).casefold(): i for i, g in enumerate(self.genes)}
+
+    @classmethod
+    def from_csv(cls, fp: Path) -> "CentralityTable":
+        """
+        读取 data/centrality/{metric}.csv：基因列为 "shared name"（找不到时取第一列），
+        数值列取基因列之外的第一列；无法转成数字的行被丢弃。
+        """
+        df = pd.read_csv(fp)
+        cols = df.columns.tolist()
+        gene_col = next((c for c in cols if c.lower() == "shared name"), cols[0])
+        val_cols = [c for c in cols if c != gene_col]
+        if not val_cols:
+            raise ValueError(f"{fp.name} 中找不到数值列")
+        values = pd.to_numeric(df[val_cols[0]], errors="coerce")
+        keep = values.notna() & df[gene_col].notna()
+        return cls(fp.stem, df.loc[keep, gene_col].astype(str).to_numpy(), values[keep].to_numpy())
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.values.nbytes + pd.Series(self.genes).memory_usage(deep=True))
+
+    def rank_of(self, gene: str):
+        """
+        返回基因的 0 基下标（名次 - 1），不在表中时返回 None。
+        """
+        return self._index.get(gene.casefold())
+
+    def rows(self, top: int, offset: int = 0) -> list:
+        """
+        名次 offset+1 … offset+top 的记录：[{"rank", "gene", "value"}, ...]。
+        """
+        end = min(offset + top, len(self))
+        return [self.row(i) for i in range(offset, end)]
+
+    def row(self, i: int) -> dict:
+        return {"rank": i + 1, "gene": self.genes[i], "value": float(self.values[i])}
+
+
+def join_rows(tables: list, genes) -> list:
+    """
+    多指标按基因拼接：每行为 {"gene", "<metric>": 数值, "<metric>_rank": 名次, ...}，
+    基因不在某个指标的排名表中时，该指标的数值与名次为 None。
+    """
+    out = []
+    for gene in genes:
+        row = {"gene": gene}
+        for t in tables:
+            i = t.rank_of(gene)
+            row[t.metric] = None if i is None else float(t.values[i])
+            row[f"{t.metric}_rank"] = None if i is None else i + 1
+        out.append(row)
+    return out
+
+
+# —— 中心性计算引擎 ——
+# 约定（前三项与 network_full.cyjs 中 CytoNCA 的加权指标一致）：
+#   - 加权度 = 相邻边权重之和；
+#   - 路径长度 = 边权重的倒数之和（共现越多距离越近）；
+#   - 接近度 = (n - 1) / Σ 距离，不可达节点的距离按 n 计；
+#   - 特征向量 = 加权邻接矩阵最大特征值对应的特征向量，取绝对值并做 L2 归一化；
+#   - 介数 = 按上述距离计算最短路径的 Brandes 无向未归一化介数（每个无序节点对只计一次），
+#     即 data/centrality/betweenness.csv 发布的取值，approximate_betweenness 估计的也是它。
+#     CytoNCA 的加权介数（network_full.cyjs 的 Betweenness_Weight_）无法由边表复现：它的零值节点数（532）
+#     与按跳数计的介数（530）接近，数值却与按跳数、1/权重、权重计距离的介数都对不上。两者在全局网络上的
+#     Spearman 相关约 0.80，排除 CDK4 / CDK6 后前 30 名重合 21 个。
+
+def _adjacency(graph) -> sp.csr_matrix:
+    n = graph.n_nodes
+    return sp.csr_matrix((graph.weights.astype(np.float64), graph.indices, graph.indptr), shape=(n, n))
+
+
+def _distance_matrix(graph) -> sp.csr_matrix:
+    n = graph.n_nodes
+    return sp.csr_matrix((1.0 / graph.weights.astype(np.float64), graph.indices, graph.indptr), shape=(n, n))
+
+
+def weighted_degree(graph) -> np.ndarray:
+    return graph.strength.astype(np.float64)
+
+
+def _power_iteration(A: sp.csr_matrix, v0: np.ndarray, shift: float):
+    """
+    对 A + shift·I 做幂迭代（平移避免二部图上 ±λ 交替不收敛），收敛返回向量，否则返回 None。
+    """
+    x = v0 / np.linalg.norm(v0)
+    for _ in range(POWER_MAX_ITER):
+        y = A @ x + shift * x
+        y /= np.linalg.norm(y)
+        if np.abs(y - x).max() < POWER_TOL:
+            return y
+        x = y
+    return None
+
+
+def eigenvector(graph, v0=None) -> np.ndarray:
+    """
+    加权邻接矩阵的主特征向量。
+    v0 为上一次的结果（图做了小幅修改时）用热启动的幂迭代求解，通常几十次矩阵-向量乘即可收敛；
+    否则（或幂迭代未收敛时）用 Lanczos 迭代（eigsh）。
+    """
+    n = graph.n_nodes
+    A = _adjacency(graph)
+    v = None
+    if v0 is not None and n and np.linalg.norm(v0) > 0:
+        v = _power_iteration(A, np.asarray(v0, dtype=np.float64), float(graph.weights.mean()) if len(graph.weights) else 1.0)
+    if v is None:
+        if n < 3:
+            _, vecs = np.linalg.eigh(A.toarray())
+            v = vecs[:, -1] if n else np.zeros(0)
+        else:
+            _, vecs = eigsh(A, k=1, which="LA", v0=weighted_degree(graph) + 1.0)
+            v = vecs[:, 0]
+    v = np.abs(v)
+    norm = np.linalg.norm(v)
+    return v / norm if norm > 0 else v
+
+
+def _batches(graph, sources):
+    """
+    把源点切成若干批，每批用 scipy 的 Dijkstra 求出 (源点数组, 距离矩阵 B × n)。
+    """
+    sources = np.asarray(sources, dtype=np.int64)
+    size = max(1, PATH_BATCH_CELLS // max(1, len(graph.indices)))
+    dist = _distance_matrix(graph)
+    for start in range(0, len(sources), size):
+        batch = sources[start:start + size]
+        yield batch, csgraph.dijkstra(dist, directed=False, indices=batch)
+
+
+class _Arcs:
+    """
+    CSR 中的每个非零元视为一条弧 u → v，附带其距离代价 1 / 权重。
+    """
+
+    def __init__(self, graph):
+        self.n = graph.n_nodes
+        self.src = np.repeat(np.arange(self.n), np.diff(graph.indptr))
+        self.dst = graph.indices.astype(np.int64)
+        self.cost = 1.0 / graph.weights.astype(np.float64)
+
+
+def _dependencies(arcs: _Arcs, batch: np.ndarray, D: np.ndarray) -> np.ndarray:
+    """
+    一批源点的 Brandes 依赖值之和（长度 n）。
+    最短路径 DAG 上的弧满足 d(s,u) + c(u,v) = d(s,v)；先一次性挑出整批源点的 DAG 弧
+    （每个源点约 n 条，远少于全部弧），再在展平的 (源点, 节点) 下标上用 bincount 迭代
+    路径数 σ 与依赖 δ，直到不再变化（迭代次数 = DAG 的最大跳数）。
+    """
+    n, size = arcs.n, len(batch) * arcs.n
+    dv = D[:, arcs.dst]
+    on = np.isfinite(dv) & np.isclose(D[:, arcs.src] + arcs.cost, dv, rtol=_TIE_RTOL, atol=0.0)
+    row, a = np.nonzero(on)
+    fu = row * n + arcs.src[a]
+    fv = row * n + arcs.dst[a]
+    seeds = np.arange(len(batch)) * n + batch
+
+    sigma = np.zeros(size)
+    sigma[seeds] = 1.0
+    while True:
+        nxt = np.bincount(fv, weights=sigma[fu], minlength=size)
+        nxt[seeds] = 1.0
+        if np.array_equal(nxt, sigma):
+            break
+        sigma = nxt
+
+    ratio = sigma[fu] / sigma[fv]
+    delta = np.zeros(size)
+    while True:
+        nxt = np.bincount(fu, weights=ratio * (1.0 + delta[fv]), minlength=size)
+        if np.array_equal(nxt, delta):
+            break
+        delta = nxt
+    delta[seeds] = 0.0
+    return delta.reshape(len(batch), n).sum(axis=0)
+
+
+def _path_stats(D: np.ndarray):
+    """
+    每个源点的 (可达节点的距离和, 可达节点数（含自身）)。
+    """
+    reach = np.isfinite(D)
+    return np.where(reach, D, 0.0).sum(axis=1), reach.sum(axis=1)
+
+
+def _closeness_from(dist_sum: np.ndarray, reach: np.ndarray, n: int) -> np.ndarray:
+    total = dist_sum + n * (n - reach)
+    out = np.zeros(len(total))
+    np.divide(n - 1, total, out=out, where=total > 0)
+    return out
+
+
+def closeness(graph) -> np.ndarray:
+    n = graph.n_nodes
+    out = np.zeros(n)
+    for batch, D in _batches(graph, np.arange(n)):
+        out[batch] = _closeness_from(*_path_stats(D), n)
+    return out
+
+
+def _dependencies_from(graph, sources) -> np.ndarray:
+    arcs = _Arcs(graph)
+    out = np.zeros(graph.n_nodes)
+    for batch, D in _batches(graph, sources):
+        out += _dependencies(arcs, batch, D)
+    return out
+
+
+def _sum_dependencies(graph, sources, workers: int = None) -> np.ndarray:
+    """
+    sources 中各源点依赖值之和。workers > 1 时把源点均分给进程池并行计算；
+    进程池依赖 fork 启动方式（子进程直接继承父进程状态），不支持 fork 的平台上退回单进程。
+    """
+    sources = np.asarray(sources, dtype=np.int64)
+    if (not workers or workers <= 1 or len(sources) < 2 * workers
+            or "fork" not in multiprocessing.get_all_start_methods()):
+        return _dependencies_from(graph, sources)
+    chunks = np.array_split(sources, workers)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork")) as pool:
+        return sum(pool.map(_dependencies_from, [graph] * len(chunks), chunks))
+
+
+def betweenness(graph, workers: int = None) -> np.ndarray:
+    return _sum_dependencies(graph, np.arange(graph.n_nodes), workers) / 2.0
+
+
+# —— 近似介数：随机抽取 k 个源点（pivot），用它们的依赖值之和按 n / k 放大估计全体 ——
+# 记 X = δ_s(v) / (n - 2) ∈ [0, 1]，由 Hoeffding 不等式并对 n 个节点取并集界，
+# 抽样 k ≥ ln(2n / (1 - confidence)) / (2 ε²) 个源点时，全部节点的归一化介数
+# （介数除以 n(n-2)/2）同时落在真值 ± ε 内的概率至少为 confidence。
+def pivot_count(n: int, epsilon: float, confidence: float = DEFAULT_CONFIDENCE) -> int:
+    """
+    达到 (epsilon, confidence) 误差界所需的源点数，不超过 n（达到 n 时即为精确计算）。
+    """
+    if n < 3:
+        return n
+    k = math.ceil(math.log(2 * n / (1 - confidence)) / (2 * epsilon ** 2))
+    return min(n, k)
+
+
+def approximate_betweenness(graph, epsilon: float, confidence: float = DEFAULT_CONFIDENCE,
+                            seed: int = 0, workers: int = None):
+    """
+    抽样估计的介数（与 betweenness 同一量纲），返回 (数组, 实际抽样的源点数)。
+    源点不放回抽样，seed 固定时结果可复现；所需源点数不少于 n 时直接精确计算。
+    """
+    n = graph.n_nodes
+    k = pivot_count(n, epsilon, confidence)
+    if k >= n:
+        return betweenness(graph, workers), n
+    pivots = np.sort(np.random.default_rng(seed).choice(n, size=k, replace=False))
+    return _sum_dependencies(graph, pivots, workers) * (n / k) / 2.0, k
+
+
+def compute_all(graph, epsilon: float = None, confidence: float = DEFAULT_CONFIDENCE,
+                workers: int = None) -> dict:
+    """
+    计算四个指标：{指标名: 与 graph.names 对齐的数组}。
+    默认一次遍历全部源点的最短路径同时得到介数与接近度；给出 epsilon 时介数改为抽样近似，
+    给出 workers 时介数的源点分给进程池并行计算。
+    """
+    if epsilon is not None or workers:
+        if epsilon is not None:
+            btw, _ = approximate_betweenness(graph, epsilon, confidence, workers=workers)
+        else:
+            btw = betweenness(graph, workers)
+        return {
+            "degree": weighted_degree(graph),
+            "betweenness": btw,
+            "closeness": closeness(graph),
+            "eigenvector": eigenvector(graph),
+        }
+    return CentralityState.build(graph).values()
+
+
+# —— 增量更新：在已算好的图上加入一批边（如增强子网中接受的预测连边），只重算受影响的部分 ——
+#   - 加权度：新图的节点强度；
+#   - 特征向量：以旧结果为初值做热启动幂迭代；
+#   - 介数 / 接近度：只有当某条新边满足 d(s,u) + c(u,v) ≤ d(s,v)（或反向）时，源点 s 的最短路径
+#     DAG 才会改变。由无向图的对称性，只需从新边端点出发各跑一次 Dijkstra 即可找出全部受影响源点；
+#     介数减去这些源点在旧图上的依赖、加上新图上的依赖，接近度只重算这些源点（及新节点）的距离和。
+class CentralityState:
+    """
+    一张图的中心性指标，以及增量更新所需的每个源点的可达距离和 / 可达节点数。
+    recomputed 为上一次 apply 实际重算最短路径的源点数（build 得到的状态为全部节点数，
+    没有加入任何新边时为 0）。
+    受影响源点过半时 apply 退回全部重算：几十个节点的子网加入一批预测连边通常就是这种情况
+    （luminal_aug / tnbc_aug 的全部源点都受影响），增量只在大图上加入少量边时才省时间。
+    """
+
+    def __init__(self, graph, betweenness, eigenvector, dist_sum, reach, recomputed: int):
+        self.graph = graph
+        self.betweenness = betweenness
+        self.eigenvector = eigenvector
+        self.dist_sum = dist_sum
+        self.reach = reach
+        self.recomputed = recomputed
+
+    @classmethod
+    def build(cls, graph) -> "CentralityState":
+        """
+        一次遍历全部源点的最短路径，同时得到介数与各源点的距离和。
+        """
+        n = graph.n_nodes
+        arcs = _Arcs(graph)
+        btw, dist_sum, reach = np.zeros(n), np.zeros(n), np.zeros(n, dtype=np.int64)
+        for batch, D in _batches(graph, np.arange(n)):
+            dist_sum[batch], reach[batch] = _path_stats(D)
+            btw += _dependencies(arcs, batch, D)
+        return cls(graph, btw / 2.0, eigenvector(graph), dist_sum, reach, n)
+
+    def values(self) -> dict:
+        n = self.graph.n_nodes
+        return {
+            "degree": weighted_degree(self.graph),
+            "betweenness": self.betweenness,
+            "closeness": _closeness_from(self.dist_sum, self.reach, n),
+            "eigenvector": self.eigenvector,
+        }
+
+    def affected_sources(self, add_s, add_t, add_w) -> np.ndarray:
+        """
+        加入边 (add_s, add_t, add_w)（新图编号，可含新节点）后最短路径 DAG 会改变的旧图源点。
+        """
+        n0 = self.graph.n_nodes
+        ends = np.unique(np.concatenate([add_s, add_t]))
+        ends = ends[ends < n0]
+        rows = {}
+        if len(ends):
+            D = csgraph.dijkstra(_distance_matrix(self.graph), directed=False, indices=ends)
+            rows = dict(zip(ends.tolist(), D))
+        unreachable = np.full(n0, np.inf)
+        hit = np.zeros(n0, dtype=bool)
+        for u, v, w in zip(add_s.tolist(), add_t.tolist(), add_w.tolist()):
+            du, dv, c = rows.get(u, unreachable), rows.get(v, unreachable), 1.0 / w
+            hit |= np.isfinite(du) & (du + c <= dv * (1 + _TIE_RTOL))
+            hit |= np.isfinite(dv) & (dv + c <= du * (1 + _TIE_RTOL))
+        return np.flatnonzero(hit)
+
+    def apply(self, sources, targets, weights) -> "CentralityState":
+        """
+        加入一批边（按基因名给出）后的新状态；原状态不变。
+        """
+        graph, add_s, add_t, add_w = self.graph.with_edges(sources, targets, weights)
+        if not len(add_s):
+            return CentralityState(self.graph, self.betweenness, self.eigenvector, self.dist_sum, self.reach, 0)
+        n0, n = self.graph.n_nodes, graph.n_nodes
+        old = self.affected_sources(add_s, add_t, add_w)
+        btw = np.zeros(n)
+        if 2 * len(old) > n0:
+            # 受影响源点过半时，“减旧依赖 + 加新依赖”比在新图上全部重算还慢
+            redo = np.arange(n)
+        else:
+            redo = np.concatenate([old, np.arange(n0, n)])
+            btw[:n0] = self.betweenness - _dependencies_from(self.graph, old) / 2.0
+        dist_sum, reach = np.zeros(n), np.ones(n, dtype=np.int64)
+        dist_sum[:n0], reach[:n0] = self.dist_sum, self.reach
+        arcs = _Arcs(graph)
+        for batch, D in _batches(graph, redo):
+            dist_sum[batch], reach[batch] = _path_stats(D)
+            btw += _dependencies(arcs, batch, D) / 2.0
+
+        v0 = np.zeros(n)
+        v0[:n0] = self.eigenvector
+        v0 += 1e-3 / max(n, 1)
+        return CentralityState(graph, btw, eigenvector(graph, v0=v0), dist_sum, reach, len(redo))
+
+
+def write_tables(graph, out_dir: Path, values: dict = None, **options) -> list:
+    """
+    把各指标的完整排名写成 out_dir/{metric}.csv（列：<指标列名>, shared name），返回写出的路径列表。
+    options 原样传给 compute_all（epsilon / confidence / workers）。
+    """
+    values = compute_all(graph, **options) if values is None else values
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    written = []
+    for metric, vals in values.items():
+        table = CentralityTable(metric, graph.names, vals)
+        fp = out_dir / f"{metric}.csv"
+        pd.DataFrame({METRIC_COLUMNS.get(metric, metric): table.values, "shared name": table.genes}).to_csv(fp, index=False)
+        written.append(fp)
+    return written
@@ -0,0 +1,176 @@
+# community.py
+# 全局基因共现网络的社区划分：加权 Louvain 模块度优化（局部移动 + 社区聚合，逐层进行），
+# 以及社区摘要（规模、内部权重、代表基因）和社区元图（社区为节点、社区间权重之和为边）。
+# 前端可以先渲染几十个社区组成的元图，再按需展开单个社区，而不是一次画出全部 800 个节点。
+
+import numpy as np
+import scipy.sparse as sp
+
+# 模块度的分辨率参数：越大社区越小越多
+DEFAULT_RESOLUTION = 1.0
+
+# 每个社区摘要里列出的代表基因数（按 pmid_count 降序，其次按节点强度）
+TOP_GENES = 10
+
+# 模块度增益低于该值时视为没有改进，避免浮点误差导致节点来回移动
+_MIN_GAIN = 1e-12
+
+
+def _local_moving(A: sp.csr_matrix, resolution: float, rng) -> np.ndarray:
+    """
+    Louvain 第一阶段：按随机顺序逐个节点移入模块度增益最大的相邻社区，直到一轮下来没有节点移动。
+    A 为对称加权邻接矩阵（聚合后的对角元为社区内部权重的两倍），返回每个节点的社区编号。
+    """
+    n = A.shape[0]
+    k = np.asarray(A.sum(axis=1)).ravel()
+    m2 = float(k.sum())
+    if m2 == 0:
+        return np.arange(n)
+    # 逐节点的内层循环用 Python 列表，避免 numpy 标量索引的开销
+    k = k.tolist()
+    comm = list(range(n))
+    tot = list(k)
+    indptr, indices, data = A.indptr.tolist(), A.indices.tolist(), A.data.tolist()
+    moved = True
+    while moved:
+        moved = False
+        for i in rng.permutation(n).tolist():
+            ci, ki = comm[i], k[i]
+            w_to = {}
+            for p in range(indptr[i], indptr[i + 1]):
+                j = indices[p]
+                if j != i:
+                    c = comm[j]
+                    w_to[c] = w_to.get(c, 0.0) + data[p]
+            tot[ci] -= ki
+            scale = resolution * ki / m2
+            best, best_gain = ci, w_to.get(ci, 0.0) - tot[ci] * scale
+            for c, w in w_to.items():
+                gain = w - tot[c] * scale
+                if gain > best_gain + _MIN_GAIN:
+                    best, best_gain = c, gain
+            tot[best] += ki
+            if best != ci:
+                comm[i] = best
+                moved = True
+    return np.asarray(comm)
+
+
+def louvain(graph, resolution: float = DEFAULT_RESOLUTION, seed: int = 0) -> np.ndarray:
+    """
+    对 GeneGraph 做加权 Louvain 社区划分，返回与 graph.names 对齐的社区编号数组。
+    社区编号按规模降序（规模相同时按最小成员编号）从 0 开始；seed 固定时结果可复现。
+    """
+    n = graph.n_nodes
+    rng = np.random.default_rng(seed)
+    A = sp.csr_matrix((graph.weights.astype(np.float64), graph.indices, graph.indptr), shape=(n, n))
+    labels = np.arange(n)
+    while True:
+        comm = _local_moving(A, resolution, rng)
+        _, comm = np.unique(comm, return_inverse=True)
+        k = comm.max() + 1 if len(comm) else 0
+        labels = comm[labels]
+        if k == A.shape[0]:
+            break
+        # 第二阶段：把每个社区聚合成一个节点，社区间权重相加，社区内部权重落在对角线上
+        P = sp.csr_matrix((np.ones(len(comm)), (np.arange(len(comm)), comm)), shape=(len(comm), k))
+        A = (P.T @ A @ P).tocsr()
+    return _relabel_by_size(labels)
+
+
+def _relabel_by_size(labels: np.ndarray) -> np.ndarray:
+    if not len(labels):
+        return labels
+    sizes = np.bincount(labels)
+    first = np.full(len(sizes), len(labels))
+    np.minimum.at(first, labels, np.arange(len(labels)))
+    order = np.lexsort((first, -sizes))
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return rank[labels]
+
+
+def modularity(graph, labels: np.ndarray, resolution: float = DEFAULT_RESOLUTION) -> float:
+    """
+    加权模块度 Q = Σ_c [ 内部权重_c / m - γ (强度_c / 2m)² ]。
+    """
+    src, dst, w = graph.edge_list()
+    m = float(w.sum())
+    if m == 0:
+        return 0.0
+    k = int(labels.max()) + 1 if len(labels) else 0
+    internal = np.bincount(labels[src], weights=w * (labels[src] == labels[dst]), minlength=k)
+    strength = np.bincount(labels, weights=graph.strength, minlength=k)
+    return float((internal / m - resolution * (strength / (2 * m)) ** 2).sum())
+
+
+def summarize(graph, labels: np.ndarray, pmid_count: dict = None, resolution: float = DEFAULT_RESOLUTION,
+              top: int = TOP_GENES) -> dict:
+    """
+    社区划分结果的 JSON 文档：
+      {
+        "resolution", "modularity", "n_communities",
+        "communities": [ {"id", "size", "internal_weight", "strength", "top_genes": [...]}, ... ],
+        "elements": { "nodes": [...], "edges": [...] },   # Cytoscape.js 社区元图
+        "assignment": { gene: 社区编号, ... }
+      }
+    pmid_count 为 {基因: 文献数}（取自 network_full.cyjs 的节点属性），用于挑选代表基因。
+    """
+    pmid_count = pmid_count or {}
+    names = graph.names
+    k = int(labels.max()) + 1 if len(labels) else 0
+    src, dst, w = graph.edge_list()
+    same = labels[src] == labels[dst]
+    internal = np.bincount(labels[src][same], weights=w[same], minlength=k)
+    strength = np.bincount(labels, weights=graph.strength, minlength=k)
+    pmids = np.array([pmid_count.get(g) or 0 for g in names], dtype=np.float64)
+
+    communities = []
+    members = [[] for _ in range(k)]
+    for i in np.lexsort((-graph.strength, -pmids)).tolist():
+        members[labels[i]].append(names[i])
+    for c in range(k):
+        communities.append({
+            "id": c,
+            "size": len(members[c]),
+            "internal_weight": float(internal[c]),
+            "strength": float(strength[c]),
+            "top_genes": members[c][:top],
+        })
+
+    # 社区间的边：按 (较小社区编号, 较大社区编号) 合并权重与边数
+    a, b = labels[src][~same], labels[dst][~same]
+    lo, hi = np.minimum(a, b), np.maximum(a, b)
+    pair = lo * k + hi
+    uniq, inverse = np.unique(pair, return_inverse=True)
+    pair_weight = np.bincount(inverse, weights=w[~same])
+    pair_count = np.bincount(inverse)
+
+    nodes = [
+        {"data": {
+            "id": f"c{c['id']}",
+            "label": c["top_genes"][0] if c["top_genes"] else f"c{c['id']}",
+            "community": c["id"],
+            "size": c["size"],
+            "internal_weight": c["internal_weight"],
+        }}
+        for c in communities
+    ]
+    edges = [
+        {"data": {
+            "id": f"c{p // k}-c{p % k}",
+            "source": f"c{p // k}",
+            "target": f"c{p % k}",
+            "weight": float(pw),
+            "edges": int(pc),
+        }}
+        for p, pw, pc in zip(uniq.tolist(), pair_weight, pair_count)
+    ]
+    return {
+        "resolution": resolution,
+        "modularity": modularity(graph, labels, resolution),
+        "n_communities": k,
+        "communities": communities,
+        "elements": {"nodes": nodes, "edges": edges},
+        "assignment": {names[i]: int(labels[i]) for i in range(len(names))},
+    }
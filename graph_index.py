@@ -0,0 +1,487 @@
+# graph_index.py
+# 全局基因共现网络（data/network/gene_cooccurrence_edges.csv）的内存索引：
+# 压缩稀疏行（CSR）邻接结构，节点为 int32 编号，权重为 float32，基因名只存一份（编号 ↔ 名称表）。
+# 邻居查询只是数组切片，不再触碰 network_full.cyjs。
+
+import heapq
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+# 最短路径的边代价：
+#   inverse —— 1 / 权重，共现越多代价越小，得到“最强”路径；
+#   hops    —— 每条边代价为 1，得到跳数最少的路径。
+PATH_COSTS = ("inverse", "hops")
+
+# 缓存的单源最短路结果个数（查询集中在 CDKN2A、CCND1、CDK4 等枢纽基因上）
+SSSP_CACHE_SIZE = 64
+
+# 个性化 PageRank：阻尼系数、收敛阈值（相邻两次迭代的 L1 差）、迭代上限，以及缓存的单种子结果个数
+PPR_ALPHA = 0.85
+PPR_TOL = 1e-10
+PPR_MAX_ITER = 1000
+PPR_CACHE_SIZE = 256
+
+# 增强子网里的预测连边只有 new_gene / old_gene / mean_score_seeds，没有共现次数；
+# 计入图时按观测到的最小共现次数 1 处理，即视为最弱的一类关联
+PREDICTED_WEIGHT = 1.0
+
+
+def split_edge_frame(df: pd.DataFrame):
+    """
+    把子网边表拆成 (观测边, 预测边) 两个 DataFrame，列均为 source, target, weight：
+      - 观测边：source / target 非空的行（原始子网的 Source,Target,Weight 也按小写列名处理）；
+      - 预测边：new_gene / old_gene 非空的行，权重取 PREDICTED_WEIGHT。
+    """
+    df = df.rename(columns=lambda c: str(c).strip().lower())
+    cols = ["source", "target", "weight"]
+    if {"source", "target"} <= set(df.columns):
+        observed = df.loc[df["source"].notna() & df["target"].notna()].copy()
+        if "weight" not in observed.columns:
+            observed["weight"] = 1.0
+        observed = observed[cols].astype({"source": str, "target": str, "weight": float})
+    else:
+        observed = pd.DataFrame(columns=cols)
+    if {"new_gene", "old_gene"} <= set(df.columns):
+        pred = df.loc[df["new_gene"].notna() & df["old_gene"].notna(), ["new_gene", "old_gene"]]
+        predicted = pd.DataFrame({
+            "source": pred["new_gene"].astype(str).str.strip(),
+            "target": pred["old_gene"].astype(str).str.strip(),
+            "weight": PREDICTED_WEIGHT,
+        })
+    else:
+        predicted = pd.DataFrame(columns=cols)
+    return observed.reset_index(drop=True), predicted.reset_index(drop=True)
+
+
+def read_edge_frame(fp: Path):
+    """
+    读取子网边表（兼容带 BOM 的表头），返回 split_edge_frame 的结果。
+    """
+    return split_edge_frame(pd.read_csv(fp, encoding="utf-8-sig"))
+
+
+class EdgeWeightIndex:
+    """
+    按权重降序排列的边索引：weights 为降序 float64 数组，src / dst 为对应端点编号（int32）。
+    “权重 ≥ N 的边”与“权重最高的 K 条边”都是同一个前缀，前缀长度用二分查找得到；
+    first_edge[v] 为节点 v 第一次出现的边序号，前缀 [0, k) 涉及的节点即 first_edge < k 的节点。
+    """
+
+    def __init__(self, src, dst, weights):
+        weights = np.asarray(weights, dtype=np.float64)
+        order = np.argsort(-weights, kind="stable")
+        self.weights = weights[order]
+        self.order = order.astype(np.int64)      # 排序后第 k 条边在原边列表中的下标
+        self.src = np.asarray(src, dtype=np.int32)[order]
+        self.dst = np.asarray(dst, dtype=np.int32)[order]
+        n = int(max(self.src.max(initial=-1), self.dst.max(initial=-1))) + 1
+        self.first_edge = np.full(n, len(order), dtype=np.int64)
+        ranks = np.arange(len(order))
+        np.minimum.at(self.first_edge, self.src, ranks)
+        np.minimum.at(self.first_edge, self.dst, ranks)
+
+    def __len__(self) -> int:
+        return len(self.weights)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.weights.nbytes + self.order.nbytes + self.src.nbytes + self.dst.nbytes
+                   + self.first_edge.nbytes)
+
+    def prefix(self, min_weight: float = None, top: int = None) -> int:
+        """
+        同时满足 权重 ≥ min_weight 与 排名前 top 的边数（即前缀长度）。
+        """
+        k = len(self.weights)
+        if min_weight is not None:
+            # weights 降序，取负后为升序
+            k = int(np.searchsorted(-self.weights, -min_weight, side="right"))
+        if top is not None:
+            k = min(k, top)
+        return k
+
+    def nodes(self, k: int) -> np.ndarray:
+        """
+        前 k 条边涉及的节点编号（升序）。
+        """
+        return np.flatnonzero(self.first_edge < k)
+
+
+class GeneGraph:
+    """
+    无向加权图的 CSR 表示：
+      - names[i]            节点 i 的基因名
+      - indptr[i]:indptr[i+1] 为节点 i 的邻接区间
+      - indices / weights   邻居编号（区间内按编号升序）与边权重
+      - top_indices / top_weights  同一区间内按权重降序（同权重按编号升序）重排的邻居与权重，
+                                   “最强的 k 个邻居”就是区间的前 k 个元素
+    每条无向边在两个端点的区间里各出现一次。
+    """
+
+    def __init__(self, names, sources, targets, weights):
+        self.names = np.asarray(names, dtype=object)
+        n = len(self.names)
+        src = np.asarray(sources, dtype=np.int32)
+        dst = np.asarray(targets, dtype=np.int32)
+        w = np.asarray(weights, dtype=np.float32)
+
+        rows = np.concatenate([src, dst])
+        cols = np.concatenate([dst, src])
+        vals = np.concatenate([w, w])
+        order = np.lexsort((cols, rows))
+        self.indices = cols[order]
+        self.weights = vals[order]
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n), out=self.indptr[1:])
+        # 按权重降序重排每个区间；indices 已在区间内按编号升序，稳定排序保证同权重按编号升序
+        by_weight = np.lexsort((-self.weights, rows[order]))
+        self.top_indices = self.indices[by_weight]
+        self.top_weights = self.weights[by_weight]
+
+        self.id_of = {name: i for i, name in enumerate(self.names)}
+        self._folded = {name.casefold(): i for i, name in enumerate(self.names)}
+        # 节点强度（相邻边权重之和）
+        self.strength = np.bincount(rows, weights=vals, minlength=n).astype(np.float32)
+
+        self._costs = {}                 # 代价类型 → 与 indices 对齐的边代价列表
+        self._sssp = OrderedDict()       # (源点, 代价类型) → (距离 dict, 前驱 dict)，LRU
+        self._sssp_lock = threading.Lock()
+        self._ppr = OrderedDict()        # (种子, alpha) → 单种子个性化 PageRank 向量，LRU
+
+    def __getstate__(self):
+        # 供进程池传递：锁与最短路缓存不随对象序列化
+        state = dict(self.__dict__)
+        for k in ("_costs", "_sssp", "_sssp_lock", "_ppr"):
+            state.pop(k)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._costs = {}
+        self._sssp = OrderedDict()
+        self._sssp_lock = threading.Lock()
+        self._ppr = OrderedDict()
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "GeneGraph":
+        """
+        由 source,target,weight 三列的边表构建；基因名按首次出现的顺序编号。
+        """
+        codes, names = pd.factorize(pd.concat([df["source"], df["target"]], ignore_index=True))
+        m = len(df)
+        return cls(names.to_numpy(dtype=object), codes[:m], codes[m:], df["weight"].to_numpy())
+
+    @classmethod
+    def from_edges_csv(cls, fp: Path) -> "GeneGraph":
+        return cls.from_frame(pd.read_csv(fp, dtype={"source": str, "target": str}))
+
+    def edge_list(self):
+        """
+        每条无向边一次：(源编号数组, 目标编号数组, 权重数组)，源编号 < 目标编号。
+        """
+        rows = np.repeat(np.arange(self.n_nodes), np.diff(self.indptr))
+        keep = rows < self.indices
+        return rows[keep], self.indices[keep].astype(np.int64), self.weights[keep]
+
+    def with_edges(self, sources, targets, weights):
+        """
+        在当前图上加入一批边（按基因名给出），返回 (新图, 新增边的源编号, 目标编号, 权重)。
+        原有节点编号不变，新基因依次追加在后面；已存在的边、重复边与自环被忽略。
+        """
+        names = list(self.names)
+        id_of = dict(self.id_of)
+
+        def nid(gene):
+            i = id_of.get(gene)
+            if i is None:
+                i = id_of[gene] = len(names)
+                names.append(gene)
+            return i
+
+        bs, bt, bw = self.edge_list()
+        seen = set(zip(bs.tolist(), bt.tolist()))
+        add_s, add_t, add_w = [], [], []
+        for a, b, w in zip(sources, targets, weights):
+            u, v = nid(a), nid(b)
+            key = (min(u, v), max(u, v))
+            if u == v or key in seen:
+                continue
+            seen.add(key)
+            add_s.append(key[0])
+            add_t.append(key[1])
+            add_w.append(w)
+        add_s = np.asarray(add_s, dtype=np.int64)
+        add_t = np.asarray(add_t, dtype=np.int64)
+        add_w = np.asarray(add_w, dtype=np.float32)
+        graph = GeneGraph(names, np.concatenate([bs, add_s]), np.concatenate([bt, add_t]),
+                          np.concatenate([bw, add_w]))
+        return graph, add_s, add_t, add_w
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.names)
+
+    @property
+    def n_edges(self) -> int:
+        return len(self.indices) // 2
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.indptr.nbytes + self.indices.nbytes + self.weights.nbytes + self.strength.nbytes
+                   + self.top_indices.nbytes + self.top_weights.nbytes
+                   + pd.Series(self.names).memory_usage(deep=True))
+
+    def node_id(self, gene: str):
+        """
+        基因名 → 节点编号；先精确匹配，再不区分大小写匹配，找不到返回 None。
+        """
+        i = self.id_of.get(gene)
+        if i is None:
+            i = self._folded.get(gene.casefold())
+        return i
+
+    def degree(self, i: int) -> int:
+        return int(self.indptr[i + 1] - self.indptr[i])
+
+    def neighbors(self, i: int, min_weight: float = 0.0, limit: int = None):
+        """
+        节点 i 权重不低于 min_weight 的邻居，按权重降序（同权重按编号升序）：
+        返回 (邻居编号数组, 权重数组)。区间已预先按权重降序排好，结果只是切片（不复制）；
+        min_weight 的截断位置用二分查找得到。
+        """
+        lo, hi = int(self.indptr[i]), int(self.indptr[i + 1])
+        w = self.top_weights[lo:hi]
+        if min_weight > 0:
+            # w 降序，取负后为升序
+            hi = lo + int(np.searchsorted(-w, -min_weight, side="right"))
+        if limit is not None:
+            hi = min(hi, lo + limit)
+        return self.top_indices[lo:hi], self.top_weights[lo:hi]
+
+    def weight_share(self, i: int, weights) -> np.ndarray:
+        """
+        邻居权重占节点 i 强度（全部相邻边权重之和）的比例。
+        """
+        s = float(self.strength[i])
+        return np.asarray(weights, dtype=np.float64) / s if s > 0 else np.zeros(len(weights))
+
+    def ego(self, i: int, hops: int, min_weight: float = 0.0, max_nodes: int = None):
+        """
+        从节点 i 出发做有界 BFS，只沿权重不低于 min_weight 的边扩展，最多 hops 跳。
+        每层先收集整个前沿的全部新邻居，每个邻居取它与前沿之间最强的一条边，
+        再按该权重降序（同权重按编号升序）加入；节点数达到 max_nodes 时截断，
+        因此保留的是整层中关联最强的邻居，而不取决于前沿节点的先后顺序。
+        返回 (节点编号列表, {节点编号: 跳数}, 是否因 max_nodes 被截断)。
+        """
+        hop_of = {i: 0}
+        order = [i]
+        frontier = [i]
+        truncated = False
+        for h in range(1, hops + 1):
+            best = {}
+            for u in frontier:
+                nbr, w = self.neighbors(u, min_weight)
+                for v, x in zip(nbr.tolist(), w.tolist()):
+                    if v not in hop_of and x > best.get(v, -1.0):
+                        best[v] = x
+            nxt = sorted(best, key=lambda v: (-best[v], v))
+            if max_nodes is not None and len(order) + len(nxt) > max_nodes:
+                nxt = nxt[:max(max_nodes - len(order), 0)]
+                truncated = True
+            for v in nxt:
+                hop_of[v] = h
+                order.append(v)
+            if truncated or not nxt:
+                break
+            frontier = nxt
+        return order, hop_of, truncated
+
+    def induced_edges(self, nodes, min_weight: float = 0.0):
+        """
+        nodes 之间权重不低于 min_weight 的全部边，每条无向边只返回一次：(源编号, 目标编号, 权重) 列表。
+        """
+        members = set(nodes)
+        out = []
+        for u in nodes:
+            lo, hi = self.indptr[u], self.indptr[u + 1]
+            for v, w in zip(self.indices[lo:hi].tolist(), self.weights[lo:hi].tolist()):
+                if u < v and w >= min_weight and v in members:
+                    out.append((u, v, w))
+        return out
+
+    # —— 最短路径 ——
+    def edge_weight(self, u: int, v: int):
+        """
+        u、v 之间的边权重；区间内邻居按编号升序，可二分查找。不相邻时返回 None。
+        """
+        lo, hi = self.indptr[u], self.indptr[u + 1]
+        k = lo + np.searchsorted(self.indices[lo:hi], v)
+        if k < hi and self.indices[k] == v:
+            return float(self.weights[k])
+        return None
+
+    def _edge_costs(self, cost: str) -> list:
+        costs = self._costs.get(cost)
+        if costs is None:
+            if cost == "inverse":
+                costs = (1.0 / self.weights.astype(np.float64)).tolist()
+            elif cost == "hops":
+                costs = [1.0] * len(self.weights)
+            else:
+                raise ValueError(f"unknown path cost: {cost}")
+            self._costs[cost] = costs
+        return costs
+
+    def _dijkstra(self, source: int, cost: str, target: int = None,
+                  banned_nodes=frozenset(), banned_edges=frozenset()):
+        """
+        Dijkstra：返回 (距离 dict, 前驱 dict)。给定 target 时弹出 target 即停止；
+        banned_nodes / banned_edges 供 k 最短路径（Yen 算法）屏蔽已用过的前缀。
+        """
+        costs = self._edge_costs(cost)
+        indptr, indices = self.indptr, self.indices
+        dist = {source: 0.0}
+        pred = {source: -1}
+        done = set()
+        heap = [(0.0, source)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if u in done:
+                continue
+            done.add(u)
+            if u == target:
+                break
+            lo, hi = int(indptr[u]), int(indptr[u + 1])
+            for k in range(lo, hi):
+                v = int(indices[k])
+                if v in done or v in banned_nodes or (u, v) in banned_edges:
+                    continue
+                nd = d + costs[k]
+                if nd < dist.get(v, float("inf")):
+                    dist[v] = nd
+                    pred[v] = u
+                    heapq.heappush(heap, (nd, v))
+        return dist, pred
+
+    def single_source(self, source: int, cost: str = "inverse"):
+        """
+        单源最短路（距离 dict, 前驱 dict），按 LRU 缓存最近查询的 SSSP_CACHE_SIZE 个源点。
+        """
+        key = (source, cost)
+        with self._sssp_lock:
+            hit = self._sssp.get(key)
+            if hit is not None:
+                self._sssp.move_to_end(key)
+                return hit
+        result = self._dijkstra(source, cost)
+        with self._sssp_lock:
+            self._sssp[key] = result
+            while len(self._sssp) > SSSP_CACHE_SIZE:
+                self._sssp.popitem(last=False)
+        return result
+
+    @staticmethod
+    def _walk(pred: dict, target: int) -> list:
+        path = []
+        while target != -1:
+            path.append(target)
+            target = pred[target]
+        return path[::-1]
+
+    def path_cost(self, path: list, cost: str = "inverse") -> float:
+        if cost == "hops":
+            return float(len(path) - 1)
+        return sum(1.0 / self.edge_weight(u, v) for u, v in zip(path, path[1:]))
+
+    def shortest_path(self, source: int, target: int, cost: str = "inverse"):
+        """
+        source → target 的最短路径（节点编号列表），不连通时返回 None。
+        图是无向的：若 target 的单源结果已在缓存中，直接反向复用。
+        """
+        with self._sssp_lock:
+            reverse = (target, cost) in self._sssp and (source, cost) not in self._sssp
+        if reverse:
+            _, pred = self.single_source(target, cost)
+            return self._walk(pred, source)[::-1] if source in pred else None
+        _, pred = self.single_source(source, cost)
+        return self._walk(pred, target) if target in pred else None
+
+    def k_shortest_paths(self, source: int, target: int, k: int, cost: str = "inverse") -> list:
+        """
+        Yen 算法：按代价升序返回至多 k 条无环路径 [(代价, 节点编号列表), ...]。
+        """
+        first = self.shortest_path(source, target, cost)
+        if first is None:
+            return []
+        found = [(self.path_cost(first, cost), first)]
+        candidates, seen = [], {tuple(first)}
+        while len(found) < k:
+            prev = found[-1][1]
+            for i in range(len(prev) - 1):
+                spur, root = prev[i], prev[:i + 1]
+                banned_edges = set()
+                for _, p in found:
+                    if p[:i + 1] == root:
+                        banned_edges.add((p[i], p[i + 1]))
+                        banned_edges.add((p[i + 1], p[i]))
+                _, pred = self._dijkstra(spur, cost, target, frozenset(root[:-1]), banned_edges)
+                if target not in pred:
+                    continue
+                path = root[:-1] + self._walk(pred, target)
+                if tuple(path) not in seen:
+                    seen.add(tuple(path))
+                    heapq.heappush(candidates, (self.path_cost(path, cost), path))
+            if not candidates:
+                break
+            found.append(heapq.heappop(candidates))
+        return found
+
+    # —— 个性化 PageRank ——
+    # 随机游走按边权重比例走向邻居，以概率 1 - alpha 跳回种子集合。
+    # PageRank 向量对跳回分布是线性的：种子集合 S 的结果等于各单个种子结果的平均，
+    # 因此按种子缓存单种子向量，新的种子集合只需对尚未缓存的种子做一次分块幂迭代。
+    def _ppr_block(self, seeds: list, alpha: float) -> np.ndarray:
+        """
+        分块幂迭代：一次求出多个单种子的个性化 PageRank，返回 n × len(seeds) 矩阵。
+        """
+        n = self.n_nodes
+        A = sp.csr_matrix((self.weights.astype(np.float64), self.indices, self.indptr), shape=(n, n))
+        strength = self.strength.astype(np.float64)
+        dangling = strength == 0
+        inv = np.divide(1.0, strength, out=np.zeros(n), where=~dangling)[:, None]
+        teleport = np.zeros((n, len(seeds)))
+        teleport[seeds, np.arange(len(seeds))] = 1.0
+        x = teleport.copy()
+        for _ in range(PPR_MAX_ITER):
+            # 孤立节点上的概率质量按跳回分布重新分配
+            lost = x[dangling].sum(axis=0)
+            y = alpha * (A @ (x * inv)) + (alpha * lost + (1 - alpha)) * teleport
+            if np.abs(y - x).sum(axis=0).max() < PPR_TOL:
+                return y
+            x = y
+        return x
+
+    def personalized_pagerank(self, seeds, alpha: float = PPR_ALPHA) -> np.ndarray:
+        """
+        以 seeds（节点编号，等权）为跳回分布的个性化 PageRank，返回长度 n、总和为 1 的向量。
+        """
+        seeds = sorted(set(seeds))
+        with self._sssp_lock:
+            cached = {s: self._ppr.get((s, alpha)) for s in seeds}
+            for s, v in cached.items():
+                if v is not None:
+                    self._ppr.move_to_end((s, alpha))
+        missing = [s for s, v in cached.items() if v is None]
+        if missing:
+            block = self._ppr_block(missing, alpha)
+            with self._sssp_lock:
+                for j, s in enumerate(missing):
+                    cached[s] = self._ppr[(s, alpha)] = block[:, j]
+                while len(self._ppr) > PPR_CACHE_SIZE:
+                    self._ppr.popitem(last=False)
+        return np.mean([cached[s] for s in seeds], axis=0)
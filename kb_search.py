@@ -0,0 +1,301 @@
+# kb_search.py
+# 知识库主表（data/stats/cdk4_6_kb.csv）实体列的检索索引：
+# 每个单元格按分隔符拆成若干实体（"CDK4,CDK6" → CDK4、CDK6），统一大小写后建立 实体 → 升序行号数组 的倒排索引。
+# 查询只访问该列的不同实体（几百到一千多个），与表的行数无关，不再对整列做 str.contains。
+
+import re
+from bisect import bisect_left
+
+import numpy as np
+import pandas as pd
+
+from kb_table import MISSING_VALUES
+
+# 参与检索的实体列（表中不存在的列自动跳过）
+ENTITY_COLUMNS = (
+    "Gene Symbol", "Cell type", "Disease", "Drugs", "Pathway",
+    "Symptoms", "Patient characteristics", "Expression level", "Markers",
+    "Environmental factors", "Metabolites",
+)
+
+# 单元格内多个实体的分隔符。"/" 不算分隔符："CDK4/6 inhibitors"、"PI3K/AKT" 是一个整体
+_SPLIT_RE = re.compile(r"[,;|，；]")
+
+_EMPTY = np.empty(0, dtype=np.int64)
+
+
+def fold(text: str) -> str:
+    """
+    检索用的规范形式：去掉首尾空白、合并连续空白并统一大小写。
+    """
+    return " ".join(str(text).split()).casefold()
+
+
+def tokenize(cell) -> list:
+    """
+    把一个单元格拆成实体列表（保留原始大小写），跳过空值与 "-"。
+    """
+    if cell is None or (isinstance(cell, float) and np.isnan(cell)):
+        return []
+    parts = (" ".join(p.split()) for p in _SPLIT_RE.split(str(cell)))
+    return [p for p in parts if p not in MISSING_VALUES]
+
+
+class EntityIndex:
+    """
+    实体列的倒排索引。对每一列：
+      - postings[列][规范实体] 为包含该实体的升序行号数组（int64）；
+      - labels[列][规范实体]   为该实体在表中出现最多的原始写法，用于展示；
+      - vocab[列]              为该列全部规范实体（升序），子串匹配只扫描它。
+    行号即原表的行序（DataFrame 的位置下标）。
+    """
+
+    def __init__(self, df: pd.DataFrame, columns=ENTITY_COLUMNS):
+        self.columns = [c for c in columns if c in df.columns]
+        self.n_rows = len(df)
+        self.postings = {}
+        self.labels = {}
+        self.vocab = {}
+        for c in self.columns:
+            parts = (
+                pd.Series(df[c].to_numpy(dtype=object))
+                .map(tokenize)
+                .explode()
+                .dropna()
+            )
+            rows = parts.index.to_numpy(dtype=np.int64)
+            folded = parts.map(fold).to_numpy(dtype=object)
+            postings = {}
+            for key, pos in pd.Series(rows).groupby(folded, sort=True).indices.items():
+                postings[key] = np.unique(rows[pos])
+            # 每个规范实体取出现次数最多的原始写法（次数相同时取字典序最小者）
+            pairs = pd.DataFrame({"key": folded, "label": parts.to_numpy(dtype=object)})
+            top = (
+                pairs.value_counts().reset_index(name="n")
+                .sort_values(["key", "n", "label"], ascending=[True, False, True])
+                .drop_duplicates("key")
+            )
+            self.postings[c] = postings
+            self.labels[c] = dict(zip(top["key"], top["label"]))
+            self.vocab[c] = list(postings)
+
+    @property
+    def nbytes(self) -> int:
+        # 供 ResourceCache 估算内存占用：行号数组 + 实体字符串（键与展示写法）
+        total = 0
+        for c in self.columns:
+            total += sum(a.nbytes for a in self.postings[c].values())
+            total += int(pd.Series(self.vocab[c], dtype=object).memory_usage(deep=True)) * 2
+        return total
+
+    def _check(self, column: str):
+        if column not in self.postings:
+            raise KeyError(column)
+
+    def lookup(self, column: str, entity: str) -> np.ndarray:
+        """
+        精确匹配一个实体（不区分大小写），返回升序行号数组。
+        """
+        self._check(column)
+        return self.postings[column].get(fold(entity), _EMPTY)
+
+    def matching_entities(self, column: str, term: str) -> list:
+        """
+        该列中包含 term（不区分大小写的子串）的规范实体列表。
+        """
+        self._check(column)
+        term = fold(term)
+        if not term:
+            return []
+        return [key for key in self.vocab[column] if term in key]
+
+    def search(self, column: str, term: str, exact: bool = False) -> np.ndarray:
+        """
+        在一列中检索，返回升序行号数组：
+          - term 按与单元格相同的分隔符拆分，各部分的结果取交集（"CDK4,CDK6" 需同时命中两者）；
+          - exact=False 时每部分做子串匹配，命中实体的行号取并集；exact=True 时只做精确匹配。
+        """
+        self._check(column)
+        parts = tokenize(term)
+        if not parts:
+            return _EMPTY
+        postings = self.postings[column]
+        rows = None
+        for part in parts:
+            if exact:
+                hit = postings.get(fold(part), _EMPTY)
+            else:
+                keys = self.matching_entities(column, part)
+                hit = np.unique(np.concatenate([postings[k] for k in keys])) if keys else _EMPTY
+            rows = hit if rows is None else np.intersect1d(rows, hit, assume_unique=True)
+            if not len(rows):
+                break
+        return rows
+
+    def search_any(self, term: str, columns=None, exact: bool = False) -> np.ndarray:
+        """
+        在多列中检索（默认全部实体列），任一列命中即可，返回升序行号数组。
+        """
+        hits = [self.search(c, term, exact) for c in (columns or self.columns)]
+        hits = [h for h in hits if len(h)]
+        if not hits:
+            return _EMPTY
+        return hits[0] if len(hits) == 1 else np.unique(np.concatenate(hits))
+
+
+# —— 模糊检索：实体的三元组（trigram）索引 ——
+# 低于该相似度的候选不返回（子串命中的实体不受此限制）
+MIN_SIMILARITY = 0.3
+
+# 候选实体的匹配类别，按排序优先级
+MATCH_KINDS = ("exact", "substring", "fuzzy")
+
+
+def trigrams(text: str) -> set:
+    """
+    规范化后的字符三元组集合；前面补两个空格、后面补一个空格，使词首、词尾也有自己的三元组。
+    """
+    padded = f"  {fold(text)} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """
+    EntityIndex 全部实体（列, 规范实体）的三元组倒排索引：三元组 → 升序实体编号数组（int32）。
+    查询时把各三元组的实体编号拼起来做一次 bincount，得到每个实体与查询共有的三元组数，
+    相似度取 Jaccard：共有数 / (查询三元组数 + 实体三元组数 - 共有数)。
+    拼写错误（"Palbocicib"）仍有大部分三元组相同，能召回正确的实体。
+    """
+
+    def __init__(self, index: EntityIndex):
+        self.index = index
+        self.columns = list(index.columns)
+        col_ids, keys = [], []
+        self.offsets = {}                # 列名 → 该列第一个实体的编号（同一列的实体编号连续）
+        for ci, c in enumerate(self.columns):
+            self.offsets[c] = len(keys)
+            col_ids.extend([ci] * len(index.vocab[c]))
+            keys.extend(index.vocab[c])
+        self.keys = keys
+        self.col_ids = np.asarray(col_ids, dtype=np.int16)
+        self.row_counts = np.asarray(
+            [len(index.postings[self.columns[ci]][k]) for ci, k in zip(col_ids, keys)], dtype=np.int64)
+        grams = {}
+        sizes = np.empty(len(keys), dtype=np.int32)
+        for e, key in enumerate(keys):
+            g = trigrams(key)
+            sizes[e] = len(g)
+            for t in g:
+                grams.setdefault(t, []).append(e)
+        self.sizes = sizes
+        self.grams = {t: np.asarray(ids, dtype=np.int32) for t, ids in grams.items()}
+
+    @property
+    def nbytes(self) -> int:
+        return int(sum(a.nbytes for a in self.grams.values()) + self.sizes.nbytes + self.row_counts.nbytes
+                   + self.col_ids.nbytes + pd.Series(self.keys, dtype=object).memory_usage(deep=True))
+
+    def search(self, term: str, columns=None, limit: int = 20, min_similarity: float = MIN_SIMILARITY,
+               matches=MATCH_KINDS) -> list:
+        """
+        返回按相关度排序的候选实体：
+          [ {"field", "value", "key", "rows", "similarity", "match"}, ... ]
+        match 为 exact（与查询相同）/ substring（包含查询）/ fuzzy（仅三元组相似）；
+        排序依次按 match 类别、相似度降序、命中行数降序。
+        matches 限定返回的类别，例如 ("fuzzy",) 只取拼写相近、但不包含查询的实体，
+        此时 limit 不会被大量子串命中占满。
+        """
+        query = fold(term)
+        if not query:
+            return []
+        wanted = self.columns if columns is None else [c for c in columns if c in self.columns]
+        col_mask = np.isin(self.col_ids, [self.columns.index(c) for c in wanted])
+
+        q = trigrams(query)
+        hits = [self.grams[t] for t in q if t in self.grams]
+        shared = (np.bincount(np.concatenate(hits), minlength=len(self.keys)) if hits
+                  else np.zeros(len(self.keys), dtype=np.int64))
+        similarity = shared / (len(q) + self.sizes - shared)
+
+        # 子串命中：短查询（一两个字符）的三元组很少，单靠相似度召回不到，直接扫描各列的不同实体
+        substring = np.zeros(len(self.keys), dtype=bool)
+        for c in wanted:
+            start = self.offsets[c]
+            substring[[start + k for k, key in enumerate(self.index.vocab[c]) if query in key]] = True
+
+        keep = col_mask & (substring | (similarity >= min_similarity))
+        cand = np.flatnonzero(keep)
+        exact = np.fromiter((self.keys[e] == query for e in cand), dtype=bool, count=len(cand))
+        category = np.where(exact, 0, np.where(substring[cand], 1, 2))
+        wanted_kinds = np.isin(category, [MATCH_KINDS.index(m) for m in matches])
+        cand, category = cand[wanted_kinds], category[wanted_kinds]
+        order = np.lexsort((-self.row_counts[cand], -similarity[cand], category))[:limit]
+        out = []
+        for e, cat in zip(cand[order].tolist(), category[order].tolist()):
+            field = self.columns[self.col_ids[e]]
+            out.append({
+                "field": field,
+                "value": self.index.labels[field][self.keys[e]],
+                "key": self.keys[e],
+                "rows": int(self.row_counts[e]),
+                "similarity": round(float(similarity[e]), 4),
+                "match": MATCH_KINDS[cat],
+            })
+        return out
+
+
+# —— 自动补全：按字段分组的有序字符串表 ——
+# 大于任何实际字符的码位，用于求“以 prefix 开头”的区间右端
+_PREFIX_END = "\U0010ffff"
+
+
+class PrefixIndex:
+    """
+    每个字段一张按规范形式升序排列的字符串表（keys），附带展示写法（labels）与频次（counts）。
+    以 prefix 开头的取值是表中连续的一段，两次二分查找即可定位，再在段内按频次取前 limit 个。
+    """
+
+    def __init__(self):
+        self.fields = {}   # 字段名 → (规范形式列表, 展示写法列表, 频次数组)
+
+    def add_field(self, field: str, labels, counts):
+        """
+        加入一个字段；规范形式相同的取值合并为一条，频次相加，展示写法取频次最高的一个。
+        """
+        df = pd.DataFrame({"key": [fold(v) for v in labels], "label": list(labels),
+                           "count": np.asarray(counts, dtype=np.int64)})
+        df = df[df["key"] != ""]
+        total = df.groupby("key", sort=True)["count"].sum()
+        label = (df.sort_values(["key", "count", "label"], ascending=[True, False, True])
+                 .drop_duplicates("key").set_index("key")["label"])
+        self.fields[field] = (total.index.tolist(), label.loc[total.index].tolist(),
+                              total.to_numpy(dtype=np.int64))
+
+    @classmethod
+    def from_entity_index(cls, index: EntityIndex) -> "PrefixIndex":
+        """
+        由 EntityIndex 构建：每个实体列一个字段，频次为包含该实体的行数。
+        """
+        out = cls()
+        for c in index.columns:
+            keys = index.vocab[c]
+            out.fields[c] = (list(keys), [index.labels[c][k] for k in keys],
+                             np.asarray([len(index.postings[c][k]) for k in keys], dtype=np.int64))
+        return out
+
+    @property
+    def nbytes(self) -> int:
+        return int(sum(pd.Series(keys + labels, dtype=object).memory_usage(deep=True) + counts.nbytes
+                       for keys, labels, counts in self.fields.values()))
+
+    def suggest(self, field: str, prefix: str, limit: int = 10) -> list:
+        """
+        字段 field 中以 prefix 开头（不区分大小写）的取值，按频次降序（同频次按字母序）：
+          [ {"value", "count"}, ... ]
+        """
+        keys, labels, counts = self.fields[field]
+        prefix = fold(prefix)
+        lo = bisect_left(keys, prefix)
+        hi = bisect_left(keys, prefix + _PREFIX_END, lo)
+        order = np.argsort(-counts[lo:hi], kind="stable")[:limit]
+        return [{"value": labels[lo + i], "count": int(counts[lo + i])} for i in order.tolist()]
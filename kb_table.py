@@ -0,0 +1,189 @@
+# kb_table.py
+# 知识库主表（data/stats/cdk4_6_kb.csv）的内存列式副本：
+# 每列一个 numpy 数组，排序、分页、字段投影都直接在数组上完成，不再经过 DataFrame → records 的整表转换。
+
+import numpy as np
+import pandas as pd
+
+# 表中用 "-" 表示该实体列无值，与空字符串同等对待
+MISSING_VALUES = ("", "-")
+
+# 一级…五级标签列：编号 "1.4.1" 有 2 个 "."，对应第 3 列 三级标签
+LABEL_COLUMNS = ("一级标签", "二级标签", "三级标签", "四级标签", "五级标签")
+
+_EMPTY = np.empty(0, dtype=np.int64)
+
+
+def _code_ancestors(code: str) -> list:
+    """
+    编号自身及其全部祖先："1.4.1" → ["1", "1.4", "1.4.1"]。
+    """
+    parts = code.split(".")
+    return [".".join(parts[:i]) for i in range(1, len(parts) + 1)]
+
+
+class LabelCodeIndex:
+    """
+    标签编号（一级…五级标签列中的 "1"、"1.4"、"1.4.1.2" …）的层级索引：
+      - subtree[编号] 为该编号子树（自身及全部后代）的升序行号数组，即子树汇总；
+      - own[编号]     为以该编号为最具体标签的行（该行没有更深的后代编号）。
+    每行的各级编号先补全祖先再归入子树，因此即使个别行的编号填错了层级列（如 "1.1.3" 写在二级标签列），
+    也能归到正确的子树下，不依赖“第几级就查第几列”的约定。
+    """
+
+    def __init__(self, columns):
+        subtree, own = {}, {}
+        for row, cells in enumerate(zip(*columns)):
+            codes = {str(v).strip() for v in cells}
+            codes = {c for c in codes if c not in MISSING_VALUES and c.lower() != "nan"}
+            closure = {a for c in codes for a in _code_ancestors(c)}
+            for c in closure:
+                subtree.setdefault(c, []).append(row)
+            for c in codes:
+                if not any(o.startswith(c + ".") for o in codes):
+                    own.setdefault(c, []).append(row)
+        self.subtree = {c: np.asarray(r, dtype=np.int64) for c, r in subtree.items()}
+        self.own = {c: np.asarray(r, dtype=np.int64) for c, r in own.items()}
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "LabelCodeIndex":
+        return cls([df[c].to_numpy(dtype=object) for c in LABEL_COLUMNS if c in df.columns])
+
+    @property
+    def nbytes(self) -> int:
+        return int(sum(a.nbytes for a in self.subtree.values()) + sum(a.nbytes for a in self.own.values()))
+
+    def rows(self, code: str, descendants: bool = True) -> np.ndarray:
+        """
+        编号 code 的行：descendants=True 时为整个子树，否则只取以 code 为最具体标签的行。
+        """
+        return (self.subtree if descendants else self.own).get(code.strip(), _EMPTY)
+
+    def counts(self, root: str = None) -> list:
+        """
+        各编号的行数，按层级顺序（"1.10" 排在 "1.9" 之后）：
+          [ {"code", "depth", "rows", "subtree_rows"}, ... ]
+        root 给出时只列出 root 及其后代。
+        """
+        codes = [c for c in self.subtree
+                 if root is None or c == root or c.startswith(root + ".")]
+        codes.sort(key=lambda c: [int(p) if p.isdigit() else p for p in c.split(".")])
+        return [
+            {
+                "code": c,
+                "depth": c.count(".") + 1,
+                "rows": len(self.own.get(c, _EMPTY)),
+                "subtree_rows": len(self.subtree[c]),
+            }
+            for c in codes
+        ]
+
+
+class KBTable:
+    """
+    列式存储的知识库表格。行号（row id）即原 CSV 中的行序，所有查询结果都以行号数组表示。
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.columns = list(df.columns)
+        self.n_rows = len(df)
+        self._cols = {c: df[c].to_numpy(dtype=object) for c in self.columns}
+        self._sort_keys = {}   # 列名 → (升序键, 降序键)，首次按该列排序时计算
+        self._value_index = {} # 列名 → {值: 升序行号数组}，首次按该列过滤时计算
+        self._folded = {}      # 列名 → (小写后的不同取值列表, 对应原值列表)
+        self._labels = None    # 标签编号的层级索引，首次按编号过滤时构建
+
+    @property
+    def nbytes(self) -> int:
+        # 供 ResourceCache 估算内存占用：指针数组 + 字符串本体
+        return sum(int(pd.Series(a).memory_usage(deep=True)) for a in self._cols.values())
+
+    def column(self, name: str) -> np.ndarray:
+        return self._cols[name]
+
+    def _keys(self, name: str):
+        """
+        为一列生成整数排序键：
+          - 非空值全部能转成数字时按数值排序（如 SN、PMID），否则按字符串排序；
+          - 相等的值共享同一个键，空值（"" 或 "-"）无论升序降序都排在最后。
+        """
+        keys = self._sort_keys.get(name)
+        if keys is not None:
+            return keys
+        values = self._cols[name]
+        empty = np.isin(values, MISSING_VALUES)
+        numeric = pd.to_numeric(pd.Series(values[~empty]), errors="coerce")
+        if numeric.notna().all():
+            uniq, inverse = np.unique(numeric.to_numpy(dtype=float), return_inverse=True)
+        else:
+            uniq, inverse = np.unique(values[~empty].astype(str), return_inverse=True)
+        k = len(uniq)
+        asc = np.full(self.n_rows, k, dtype=np.int64)
+        desc = np.full(self.n_rows, k, dtype=np.int64)
+        asc[~empty] = inverse
+        desc[~empty] = k - 1 - inverse
+        keys = (asc, desc)
+        self._sort_keys[name] = keys
+        return keys
+
+    def sort(self, row_ids: np.ndarray, column: str, descending: bool = False) -> np.ndarray:
+        """
+        按 column 对 row_ids 做稳定排序；键相同时保持原有行序。
+        """
+        key = self._keys(column)[1 if descending else 0]
+        return row_ids[np.argsort(key[row_ids], kind="stable")]
+
+    # —— 过滤：每列一个“值 → 行号数组”的倒排索引，结果均为升序行号数组 ——
+    def value_index(self, name: str) -> dict:
+        index = self._value_index.get(name)
+        if index is None:
+            groups = pd.Series(self._cols[name]).groupby(self._cols[name], sort=False).indices
+            index = {v: rows.astype(np.int64) for v, rows in groups.items()}
+            self._value_index[name] = index
+        return index
+
+    def match_eq(self, name: str, value: str) -> np.ndarray:
+        return self.value_index(name).get(value, _EMPTY)
+
+    def match_in(self, name: str, values) -> np.ndarray:
+        index = self.value_index(name)
+        parts = [index[v] for v in set(values) if v in index]
+        if not parts:
+            return _EMPTY
+        return np.sort(np.concatenate(parts))
+
+    def match_contains(self, name: str, term: str) -> np.ndarray:
+        """
+        不区分大小写的子串匹配：只扫描该列的不同取值，再合并命中取值的行号。
+        """
+        folded = self._folded.get(name)
+        if folded is None:
+            originals = list(self.value_index(name))
+            folded = ([v.casefold() for v in originals], originals)
+            self._folded[name] = folded
+        term = term.casefold()
+        hits = [orig for low, orig in zip(*folded) if term in low]
+        return self.match_in(name, hits)
+
+    def label_index(self) -> LabelCodeIndex:
+        if self._labels is None:
+            self._labels = LabelCodeIndex([self._cols[c] for c in LABEL_COLUMNS if c in self._cols])
+        return self._labels
+
+    def match_code(self, code: str, descendants: bool = True) -> np.ndarray:
+        """
+        标签编号过滤：默认返回编号 code 所在子树的全部行（"1.4" 命中 1.4、1.4.1、1.4.1.2 …）；
+        descendants=False 时只返回以 code 为最具体标签的行。
+        """
+        return self.label_index().rows(code, descendants)
+
+    def all_rows(self) -> np.ndarray:
+        return np.arange(self.n_rows, dtype=np.int64)
+
+    def records(self, row_ids: np.ndarray, fields=None) -> list:
+        """
+        把 row_ids 对应的行转成 [{列名: 值}, ...]；fields 为 None 时返回全部列。
+        """
+        fields = self.columns if fields is None else fields
+        cols = [self._cols[f][row_ids] for f in fields]
+        return [dict(zip(fields, vals)) for vals in zip(*cols)]
@@ -0,0 +1,192 @@
+# resource_cache.py
+# 进程级的“已解析资源”缓存：同一文件只解析一次，解析结果常驻内存，
+# 文件 mtime/size 变化时自动失效，超出内存预算时按 LRU 淘汰。
+# 并发请求同一个未缓存资源时只解析一次（single-flight），其余请求等待同一结果。
+
+import asyncio
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+# 内存预算（MB），可用环境变量 CDK46KB_CACHE_MAX_MB 调整
+DEFAULT_MAX_MB = 512
+
+# 冷加载（磁盘读取 + 解析）专用线程数，可用环境变量 CDK46KB_LOAD_WORKERS 调整
+DEFAULT_LOAD_WORKERS = 4
+
+# _lookup 未命中时返回的哨兵（缓存值本身可能是 None）
+_MISS = object()
+
+# 对无法精确估算大小的 Python 对象（dict/list 等），按源文件大小乘以该系数估算
+_OBJECT_EXPANSION = 4
+
+
+def _estimate_size(obj, file_size: int) -> int:
+    """
+    粗略估算缓存对象占用的内存字节数：
+      - bytes / str            → 长度
+      - pandas.DataFrame       → memory_usage(deep=True) 之和
+      - 带 nbytes 属性的对象    → nbytes（numpy 数组等）
+      - 其它（dict、list …）   → 源文件大小 × _OBJECT_EXPANSION
+    """
+    if isinstance(obj, (bytes, bytearray, str)):
+        return len(obj)
+    memory_usage = getattr(obj, "memory_usage", None)
+    if callable(memory_usage):
+        try:
+            return int(memory_usage(index=True, deep=True).sum())
+        except TypeError:
+            pass
+    nbytes = getattr(obj, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    return file_size * _OBJECT_EXPANSION
+
+
+class ResourceCache:
+    """
+    以 (文件路径, loader) 为键缓存 loader(path) 的返回值。
+      - 每次 get 都会 stat 一次文件，(mtime_ns, size) 与缓存时不同则重新解析；
+      - 总占用超过 max_bytes 时，从最久未使用的条目开始淘汰；
+      - 单个超过预算的对象照常返回，但不会进入缓存；
+      - 同一个键同时只会有一个线程在执行 loader，其它调用方等待它的结果。
+    同一个文件可以挂多个 loader（例如 DataFrame 和由它派生的 records），互不影响。
+    异步代码使用 aget：命中时直接在事件循环里返回，未命中时才把加载交给专用线程池。
+    """
+
+    def __init__(self, max_bytes: int, executor: ThreadPoolExecutor):
+        self.max_bytes = max_bytes
+        self.executor = executor
+        self._entries = OrderedDict()   # key → (signature, value, size)
+        self._inflight = {}             # key → 正在加载的 Future
+        self._total = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _signature(path: Path):
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+
+    def _lookup(self, key, sig):
+        """
+        在锁内调用：命中返回 (value, None)；否则返回 (_MISS, 正在加载该键的 Future 或 None)。
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == sig:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], None
+        return _MISS, self._inflight.get(key)
+
+    def _claim(self, key, sig):
+        """
+        命中返回 (value, None, False)；否则返回 (_MISS, Future, owner)：owner 为 True 时
+        调用方负责执行 loader 并完成该 Future，否则只需等待它。
+        新建的 Future 立即标记为运行中，等待方被取消时不会连带取消它。
+        """
+        with self._lock:
+            value, pending = self._lookup(key, sig)
+            if value is not _MISS:
+                return value, None, False
+            if pending is not None:
+                return _MISS, pending, False
+            pending = self._inflight[key] = Future()
+            pending.set_running_or_notify_cancel()
+            self.misses += 1
+            return _MISS, pending, True
+
+    def _load(self, key, sig, path: Path, loader, pending: Future):
+        """
+        执行 loader(path)，写入缓存并完成 pending；loader 出错时异常同样交给 pending。
+        """
+        try:
+            value = loader(path)
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            pending.set_exception(e)
+            raise
+        with self._lock:
+            self._store(key, sig, value)
+            self._inflight.pop(key, None)
+        pending.set_result(value)
+        return value
+
+    def get(self, path, loader):
+        """
+        返回 loader(path) 的结果；命中且文件未变化时直接返回内存中的对象。
+        文件不存在时抛出 FileNotFoundError（由调用方转换成 404）。
+        """
+        path = Path(path)
+        key = (str(path), loader)
+        sig = self._signature(path)
+        value, pending, owner = self._claim(key, sig)
+        if value is not _MISS:
+            return value
+        if not owner:
+            return pending.result()
+        return self._load(key, sig, path, loader, pending)
+
+    async def aget(self, path, loader, executor: ThreadPoolExecutor = None):
+        """
+        get 的异步版本：
+          - 命中时不切换线程，直接返回；
+          - 未命中时在事件循环里登记 in-flight Future，只有登记者把加载交给专用线程池
+            （线程池有上限，不占用 Starlette 的默认线程池）；
+          - 其余调用方（包括同时到达的冷请求）都在事件循环里等待同一个 Future，不占用线程。
+        executor 给出时改在该线程池里加载，用于耗时很长、不应占用冷加载线程池的计算。
+        """
+        path = Path(path)
+        key = (str(path), loader)
+        sig = self._signature(path)
+        value, pending, owner = self._claim(key, sig)
+        if value is not _MISS:
+            return value
+        if owner:
+            # 用 submit 而不是 run_in_executor：异常已经交给 pending，线程池一侧的 Future 无人等待
+            (executor or self.executor).submit(self._load, key, sig, path, loader, pending)
+        return await asyncio.wrap_future(pending)
+
+    def _store(self, key, sig, value):
+        size = _estimate_size(value, sig[1])
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total -= old[2]
+            if size <= self.max_bytes:
+                self._entries[key] = (sig, value, size)
+                self._total += size
+                self._evict()
+
+    def _evict(self):
+        while self._total > self.max_bytes and self._entries:
+            _, (_, _, size) = self._entries.popitem(last=False)
+            self._total -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total = 0
+
+    def info(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "inflight": len(self._inflight),
+            }
+
+
+# 进程内共享的冷加载线程池与默认缓存实例
+LOAD_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("CDK46KB_LOAD_WORKERS", DEFAULT_LOAD_WORKERS)),
+    thread_name_prefix="resource-loader",
+)
+CACHE = ResourceCache(int(os.environ.get("CDK46KB_CACHE_MAX_MB", DEFAULT_MAX_MB)) * 1024 * 1024, LOAD_EXECUTOR)
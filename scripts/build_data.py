@@ -9,9 +9,16 @@ import pandas as pd
 import json
 import os
 import shutil
+import sys
 import zipfile
 from pathlib import Path
 
+# 让脚本能导入仓库根目录下的模块（centrality.py、graph_index.py）
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from centrality import METRIC_COLUMNS, compute_all, write_tables
+from community import louvain, summarize
+from graph_index import GeneGraph
+
 RAW = Path("raw_data")
 DST = Path("data")
 
@@ -86,37 +93,83 @@ if style_src.exists():
 else:
     print("⚠ missing styles.json in raw_data/2.network")
 
+# 2.1 社区划分（加权 Louvain）→ data/network/communities.json
+#     节点 → 社区编号、各社区摘要（规模 / 内部权重 / 按 pmid_count 排序的代表基因）与社区元图
+edges_csv = NETWORK / "gene_cooccurrence_edges.csv"
+full_cyjs = NETWORK / "network_full.cyjs"
+if edges_csv.exists():
+    graph = GeneGraph.from_edges_csv(edges_csv)
+    pmid_count = {}
+    if full_cyjs.exists():
+        with open(full_cyjs, "r", encoding="utf-8") as f:
+            for node in json.load(f).get("elements", {}).get("nodes", []):
+                pmid_count[node["data"].get("name")] = node["data"].get("pmid_count")
+    doc = summarize(graph, louvain(graph), pmid_count)
+    with open(NETWORK / "communities.json", "w", encoding="utf-8") as f:
+        json.dump(doc, f, ensure_ascii=False)
+    print(f"✔ communities: {doc['n_communities']} communities, modularity {doc['modularity']:.3f} "
+          f"→ data/network/communities.json")
+
 
 # ——————————————————————————————————————————————————————————
 # 3. Centrality 模块
-#    raw_data\3.centrality\*.xlsx 中带 "top32" 的文件转换为 CSV，放到 data\centrality
-#    例如 "Betweenness(Weight)top32.xlsx" → data/centrality/betweenness.csv
-#    把所有 "*top32.xlsx" 读出来，去除 "(Weight)top32" 后缀，lowercase，写为 .csv
+#    直接从 data\network\gene_cooccurrence_edges.csv 计算全部节点的加权
+#    degree / betweenness / closeness / eigenvector，写出完整排名表 data/centrality/{metric}.csv，
+#    列为 "<Metric>(Weight)", "shared name"（degree / closeness / eigenvector 与 Cytoscape CytoNCA 的
+#    加权指标一致；betweenness 为按 1/权重 计距离的 Brandes 介数，与 CytoNCA 的取值不同，详见 centrality.py）
+#    边表不存在时，退回旧流程：把 raw_data\3.centrality 里 Cytoscape 导出的表格转换为 CSV
+#    （优先取全部节点的 "<Metric>(Weight).xlsx"，没有时取 "*top32.xlsx"）
+#    大网络可用环境变量改为近似介数 / 多进程：
+#      CDK46KB_BETWEENNESS_EPSILON=0.01   抽样近似介数的误差 ε（不设则精确计算）
+#      CDK46KB_BETWEENNESS_CONFIDENCE=0.95 近似介数的置信度
+#      CDK46KB_BUILD_WORKERS=8             介数计算的进程数
 # ——————————————————————————————————————————————————————————
 
 centrality_folder = RAW / "3.centrality"
-if centrality_folder.exists():
-    for f in centrality_folder.iterdir():
-        fname = f.name
-        # 我们只处理 “*top32.xlsx” 这类文件
-        if fname.lower().endswith("top32.xlsx"):
-            # 例如： "Betweenness(Weight)top32.xlsx"
-            # 先去掉后缀 ".xlsx"
-            stem = fname[:-5]  # e.g. "Betweenness(Weight)top32"
-            # 再去掉 "(Weight)top32"
-            metric_name = stem.replace("(Weight)top32", "").lower()  # e.g. "betweenness"
-            try:
-                df = pd.read_excel(f)
-            except Exception as e:
-                print(f"⚠ failed to read {fname}: {e}")
-                continue
-            # 输出 CSV 路径
-            out_csv = CENTRALITY / f"{metric_name}.csv"
-            df.to_csv(out_csv, index=False)
-            print(f"✔ centrality: converted {fname} → data/centrality/{metric_name}.csv")
+centrality_options = {}
+if os.environ.get("CDK46KB_BETWEENNESS_EPSILON"):
+    centrality_options["epsilon"] = float(os.environ["CDK46KB_BETWEENNESS_EPSILON"])
+if os.environ.get("CDK46KB_BETWEENNESS_CONFIDENCE"):
+    centrality_options["confidence"] = float(os.environ["CDK46KB_BETWEENNESS_CONFIDENCE"])
+if os.environ.get("CDK46KB_BUILD_WORKERS"):
+    centrality_options["workers"] = int(os.environ["CDK46KB_BUILD_WORKERS"])
+
+
+def convert_cytoscape_table(metric_name: str) -> bool:
+    """
+    把 Cytoscape 导出的 <Metric>(Weight).xlsx（没有时用 <Metric>(Weight)top32.xlsx）
+    转成 data/centrality/{metric_name}.csv，成功返回 True。
+    """
+    column = METRIC_COLUMNS[metric_name]
+    for f in (centrality_folder / f"{column}.xlsx", centrality_folder / f"{column}top32.xlsx"):
+        if not f.exists():
+            continue
+        try:
+            df = pd.read_excel(f)
+        except Exception as e:
+            print(f"⚠ failed to read {f.name}: {e}")
+            continue
+        # 导出表末尾可能有基因名为空的行
+        df = df.dropna(subset=["shared name"])
+        df.to_csv(CENTRALITY / f"{metric_name}.csv", index=False)
+        print(f"✔ centrality: converted {f.name} → data/centrality/{metric_name}.csv")
+        return True
+    return False
+
+
+if edges_csv.exists():
+    graph = GeneGraph.from_edges_csv(edges_csv)
+    values = compute_all(graph, **centrality_options)
+    for out_csv in write_tables(graph, CENTRALITY, values):
+        print(f"✔ centrality: computed {out_csv.stem} for {graph.n_nodes} genes → data/centrality/{out_csv.name}")
+    print("✔ centrality module done")
+elif centrality_folder.exists():
+    for metric_name in METRIC_COLUMNS:
+        if not convert_cytoscape_table(metric_name):
+            print(f"⚠ missing Cytoscape export for {metric_name} in raw_data/3.centrality")
     print("✔ centrality module done")
 else:
-    print("⚠ missing folder raw_data/3.centrality")
+    print("⚠ missing data/network/gene_cooccurrence_edges.csv and raw_data/3.centrality")
 
 
 # ——————————————————————————————————————————————————————————
@@ -0,0 +1,45 @@
+# tests/test_kb_search.py
+# 实体索引检索与原先 str.contains 子串过滤的一致性（使用仓库中的知识库主表）。
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from kb_search import EntityIndex, TrigramIndex
+
+KB_FP = Path(__file__).resolve().parent.parent / "data" / "stats" / "cdk4_6_kb.csv"
+
+pytestmark = pytest.mark.skipif(not KB_FP.exists(), reason="data/stats/cdk4_6_kb.csv 不存在")
+
+
+@pytest.fixture(scope="module")
+def kb():
+    df = pd.read_csv(KB_FP)
+    return df, EntityIndex(df)
+
+
+def _substring_rows(df: pd.DataFrame, column: str, term: str) -> np.ndarray:
+    # Global Network 页面原先的过滤方式
+    mask = df[column].astype(str).str.contains(term, case=False, regex=False, na=False)
+    return np.flatnonzero(mask.to_numpy())
+
+
+@pytest.mark.parametrize("column, term", [
+    ("Disease", "cancer"),
+    ("Drugs", "inhib"),
+    ("Cell type", "cell"),
+    ("Gene Symbol", "a"),
+])
+def test_search_matches_substring_filter(kb, column, term):
+    df, index = kb
+    # 命中的不同实体超过旧版候选列表的 50 个上限，行集合仍须与子串过滤完全一致
+    assert len(index.matching_entities(column, term)) > 50
+    np.testing.assert_array_equal(index.search(column, term), _substring_rows(df, column, term))
+
+
+def test_fuzzy_candidates_exclude_substring_hits(kb):
+    _, index = kb
+    candidates = TrigramIndex(index).search("cancer", ["Disease"], limit=20, matches=("fuzzy",))
+    assert all(c["match"] == "fuzzy" and "cancer" not in c["key"] for c in candidates)
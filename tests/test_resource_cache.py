@@ -0,0 +1,65 @@
+# tests/test_resource_cache.py
+# ResourceCache 的 single-flight：并发的冷请求只加载一次，等待方不占用加载线程。
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from resource_cache import ResourceCache
+
+
+def test_concurrent_cold_aget_uses_one_loader_thread(tmp_path):
+    fp = tmp_path / "data.txt"
+    fp.write_text("x")
+    executor = ThreadPoolExecutor(max_workers=2)
+    cache = ResourceCache(1024 * 1024, executor)
+    release = threading.Event()
+    calls = []
+
+    def loader(path):
+        calls.append(threading.current_thread().name)
+        release.wait(5)
+        return path.read_text()
+
+    async def main():
+        waiters = [asyncio.ensure_future(cache.aget(fp, loader)) for _ in range(8)]
+        await asyncio.sleep(0.05)
+        # 加载仍在进行，另一个线程必须空闲：等待方没有占用线程池
+        free = await asyncio.wait_for(asyncio.wrap_future(executor.submit(lambda: "free")), 1)
+        release.set()
+        return free, await asyncio.gather(*waiters)
+
+    free, values = asyncio.run(main())
+    executor.shutdown()
+    assert free == "free"
+    assert values == ["x"] * 8
+    assert len(calls) == 1
+    assert cache.info()["inflight"] == 0
+
+
+def test_loader_error_reaches_every_waiter_and_is_not_cached(tmp_path):
+    fp = tmp_path / "data.txt"
+    fp.write_text("x")
+    cache = ResourceCache(1024 * 1024, ThreadPoolExecutor(max_workers=1))
+    release = threading.Event()
+    calls = []
+
+    def loader(path):
+        calls.append(1)
+        release.wait(5)
+        raise ValueError("bad file")
+
+    async def main():
+        waiters = [asyncio.ensure_future(cache.aget(fp, loader)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        release.set()
+        return await asyncio.gather(*waiters, return_exceptions=True)
+
+    errors = asyncio.run(main())
+    assert all(isinstance(e, ValueError) for e in errors)
+    assert len(calls) == 1
+    with pytest.raises(ValueError):
+        cache.get(fp, loader)
+    assert len(calls) == 2